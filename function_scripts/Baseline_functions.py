@@ -1,9 +1,38 @@
 ###### libraries ################################################
 import pandas as pd
+import numpy as np
 from sklearn.model_selection import KFold
 from sklearn.metrics import mean_squared_error
+from data_import_functions import categorical_columns
 
 ###### Classes and Functions #################################################
+def level_codes(X, columns, categories = None):
+    """
+    Integer code of the combination of levels of each row
+    
+    Parameters:
+    ===========
+    X: dataframe
+    columns: list of categorical columns
+    categories: list of level arrays per column (levels found in X if None)
+    
+    Returns:
+    ========
+    codes: array(n_samples,) flat combination code (-1 for unseen or missing levels)
+    categories: list of level arrays per column
+    """
+    if categories is None:
+        categories = [pd.Categorical(X[col]).categories for col in columns]
+    
+    col_codes = [pd.Categorical(X[col], categories = levels).codes.astype(np.int64) 
+                 for col, levels in zip(columns, categories)]
+    unseen = np.any([c < 0 for c in col_codes], axis = 0)
+    
+    dims = [len(levels) for levels in categories]
+    codes = np.ravel_multi_index([np.where(unseen, 0, c) for c in col_codes], dims)
+    codes[unseen] = -1
+    return codes, categories
+
 class avg_per_industry_degree():
     """
     Creates a model based on averages of categorical variable levels
@@ -25,18 +54,38 @@ class avg_per_industry_degree():
         y: dataframe, series, or numpy array
         columns: list of columns to have the averages based on
         """
-        X_copy = X.copy()
-        
-        if (all(x in X.columns[X.dtypes == "O"] for x in self.fitted_columns)):
-            X_copy["target"] = y.copy()
-            self.level_averages = X_copy.groupby(self.fitted_columns) \
-                                   .mean() \
-                                   .drop(["yearsExperience", "milesFromMetropolis"], axis = 1)
+        if (all(x in categorical_columns(X) for x in self.fitted_columns)):
+            codes, self.categories = level_codes(X, self.fitted_columns)
+            target = np.asarray(y, dtype = np.float64).ravel()
+            
+            # dense array of level sums/counts indexed by combination code
+            seen = codes >= 0
+            n_levels = int(np.prod([len(levels) for levels in self.categories]))
+            sums = np.bincount(codes[seen], weights = target[seen], minlength = n_levels)
+            self.level_counts = np.bincount(codes[seen], minlength = n_levels)
+            
+            # unseen combinations fall back to the global mean
+            self.global_mean = target.mean()
+            self.level_means = np.where(self.level_counts > 0, 
+                                        sums / np.maximum(self.level_counts, 1), 
+                                        self.global_mean)
             self.fitted = True
             return self
         
         else:
             print("Please choose categorical columns that are in the dataset.")
+            
+    @property
+    def level_averages(self):
+        """
+        Averages of the observed levels as a dataframe["target"]
+        """
+        observed = np.flatnonzero(self.level_counts)
+        dims = [len(levels) for levels in self.categories]
+        levels = [np.asarray(cats)[codes] for cats, codes in 
+                  zip(self.categories, np.unravel_index(observed, dims))]
+        index = pd.MultiIndex.from_arrays(levels, names = self.fitted_columns)
+        return pd.DataFrame({"target": self.level_means[observed]}, index = index)
         
     def predict(self, X):
         """
@@ -46,14 +95,15 @@ class avg_per_industry_degree():
         
         Returns:
         ========
-        pred: dataframe["jobId", "target_y"]
+        pred: dataframe["jobId", "target"]
         """
         if self.fitted:
-            pred = pd.merge(X, 
-                            self.level_averages, 
-                            how = "left", 
-                            left_on = self.fitted_columns, 
-                            right_on = self.fitted_columns)[["jobId", "target"]]
+            codes, _ = level_codes(X, self.fitted_columns, self.categories)
+            target = np.where(codes >= 0, self.level_means[np.maximum(codes, 0)], self.global_mean)
+            
+            pred = pd.DataFrame({"target": target})
+            if "jobId" in X.columns:
+                pred.insert(0, "jobId", X["jobId"].to_numpy())
             return pred
         
         else:
@@ -95,3 +145,62 @@ def cross_val(model, X, y, cv = 3):
         mse.append(mean_squared_error(predictions["target"], target_test))
         
     return mse
+
+
+def cross_val_group_means(X, y, column_sets, cv = 3):
+    """
+    Return MSE for each cross validation of several group average baselines.
+    Level sums and counts are computed per fold in a single pass, and the
+    out-of-fold averages are derived by subtracting a fold from the totals.
+    Uses the same folds as cross_val.
+    
+    Parameters:
+    ===========
+    X: dataframe consisting of features
+    y: dataframe or 1-D array with target values
+    column_sets: list of lists of categorical columns
+        Ex: [["industry", "degree"], ["jobType"]]
+    cv: int
+        number of folds
+    
+    Returns:
+    ========
+    mse: dict {columns joined by " & ": list of mse from each cv iteration}
+    """
+    kf = KFold(n_splits = cv, shuffle = True, random_state = 42)
+    target = np.asarray(y, dtype = np.float64).ravel()
+    
+    # fold of each row
+    fold = np.empty(len(target), dtype = np.int64)
+    for i, (_, test_index) in enumerate(kf.split(X)):
+        fold[test_index] = i
+    
+    # global mean of the training rows of each fold (fallback for unseen levels)
+    fold_sums = np.bincount(fold, weights = target, minlength = cv)
+    fold_counts = np.bincount(fold, minlength = cv)
+    train_means = (fold_sums.sum() - fold_sums) / (fold_counts.sum() - fold_counts)
+    
+    mse = {}
+    for columns in column_sets:
+        codes, categories = level_codes(X, columns)
+        n_levels = int(np.prod([len(levels) for levels in categories]))
+        seen = codes >= 0
+        
+        # sums/counts of every (fold, level) pair in one bincount
+        key = fold[seen] * n_levels + codes[seen]
+        sums = np.bincount(key, weights = target[seen], minlength = cv * n_levels).reshape(cv, n_levels)
+        counts = np.bincount(key, minlength = cv * n_levels).reshape(cv, n_levels)
+        
+        # out-of-fold averages: totals minus the held out fold
+        train_sums = sums.sum(axis = 0) - sums
+        train_counts = counts.sum(axis = 0) - counts
+        level_means = np.where(train_counts > 0, 
+                               train_sums / np.maximum(train_counts, 1), 
+                               train_means[:, None])
+        
+        predictions = np.where(seen, level_means[fold, np.maximum(codes, 0)], train_means[fold])
+        squared_error = (predictions - target) ** 2
+        fold_mse = np.bincount(fold, weights = squared_error, minlength = cv) / fold_counts
+        mse[" & ".join(columns)] = list(fold_mse)
+        
+    return mse
@@ -0,0 +1,393 @@
+# libraries
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import time
+import hashlib
+import platform
+import argparse
+from datetime import datetime
+import sklearn
+from sklearn.base import clone
+from Deployment_helper import score_data
+from Preprocessing import matrix_nbytes, shared_cv_mse_stats, reset_peak_rss, peak_rss_mb
+from Train_models import training_plan, build_features
+from results import plot_scaling
+
+"""
+Benchmarks of the scoring path and of model training on synthetic job
+listings.
+
+Reports are JSON files in results/benchmarks that record the model files
+they were measured with, so reports of two model versions (or two commits)
+can be compared with compare_benchmarks.
+
+Run from the project root (the folder holding "model"):
+    python function_scripts/Benchmark_functions.py --max-rows 1000000
+    python function_scripts/Benchmark_functions.py --compare results/benchmarks/old.json
+    python function_scripts/Benchmark_functions.py --training --max-rows 100000
+"""
+
+# levels of the categorical columns of the job listings
+LEVELS = {"jobType": ["CEO", "CFO", "CTO", "VICE_PRESIDENT", "MANAGER", "SENIOR", "JUNIOR", "JANITOR"],
+          "degree": ["DOCTORAL", "MASTERS", "BACHELORS", "HIGH_SCHOOL", "NONE"],
+          "major": ["MATH", "PHYSICS", "CHEMISTRY", "BIOLOGY", "COMPSCI", "ENGINEERING",
+                    "BUSINESS", "LITERATURE", "NONE"],
+          "industry": ["WEB", "FINANCE", "OIL", "HEALTH", "AUTO", "SERVICE", "EDUCATION"]}
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000, 1000000, 10000000]
+
+### Functions
+def make_job_listings(n_rows, random_state = 42, target = False):
+    """
+    Generates synthetic job listings with the schema of the raw data
+
+    Parameters:
+    ===========
+    n_rows: int number of listings
+    random_state: int seed
+    target: Boolean adds a synthetic salary column
+
+    Returns:
+    ========
+    listings: DataFrame [jobId, companyId, jobType, degree, major, industry,
+        yearsExperience, milesFromMetropolis(, salary)]
+    """
+    rng = np.random.RandomState(random_state)
+    ids = pd.Series(np.arange(n_rows)).astype(str)
+    listings = pd.DataFrame({"jobId": "JOB" + ids,
+                             "companyId": "COMP" + pd.Series(rng.randint(0, 63, n_rows)).astype(str)})
+
+    codes = {}
+    for col, levels in LEVELS.items():
+        codes[col] = rng.randint(0, len(levels), n_rows)
+        listings[col] = np.array(levels, dtype = object)[codes[col]]
+
+    listings["yearsExperience"] = rng.randint(0, 25, n_rows)
+    listings["milesFromMetropolis"] = rng.randint(0, 100, n_rows)
+
+    if target:
+        # level effects decrease with the position of the level in LEVELS
+        salary = 60 + 2 * listings["yearsExperience"] - 0.4 * listings["milesFromMetropolis"]
+        for col, levels in LEVELS.items():
+            salary = salary + 8 * (len(levels) - 1 - codes[col])
+        listings["salary"] = np.maximum(salary + rng.normal(0, 15, n_rows), 1).round()
+    return listings
+
+def model_fingerprint():
+    """
+    Identifies the model version a benchmark was measured with
+
+    Returns:
+    ========
+    fingerprint: dict {filename: sha1 of the file}
+    """
+    PROJECT_ROOT_DIR = "."
+    fingerprint = {}
+    for filename in ["pipeline.pkl", "best_model.pkl"]:
+        path = os.path.join(PROJECT_ROOT_DIR, "model", filename)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                fingerprint[filename] = hashlib.sha1(file.read()).hexdigest()
+    return fingerprint
+
+def environment_info():
+    """
+    Returns:
+    ========
+    info: dict of the versions and hardware the benchmark ran on
+    """
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__}
+
+def _latency_stats(seconds):
+    seconds = np.array(seconds) * 1000
+    return {"mean_ms": float(seconds.mean()),
+            "p50_ms": float(np.percentile(seconds, 50)),
+            "p99_ms": float(np.percentile(seconds, 99))}
+
+def _score_stages(features):
+    """
+    Scores one batch through score_data
+
+    Returns:
+    ========
+    timings: dict {stage: seconds} (see score_data)
+    """
+    timings = {}
+    score_data(features, timings = timings)
+    return timings
+
+def _peak_memory_mb(features):
+    """
+    Peak resident memory of scoring one batch, above the memory held 
+    before the call (NaN outside Linux)
+    """
+    baseline = reset_peak_rss()
+    score_data(features)
+    return peak_rss_mb(baseline)
+
+def benchmark_scoring(batch_sizes = BATCH_SIZES, max_repeats = 200, rows_per_size = 1000000,
+                      random_state = 42):
+    """
+    Measures throughput, per stage latency and peak memory of the scoring
+    path (preprocess_pipeline, model_predict and the prediction DataFrame)
+
+    Parameters:
+    ===========
+    batch_sizes: list(int) rows per scoring call
+    max_repeats: int maximum number of timed calls per batch size
+    rows_per_size: int small batches are repeated until they score about
+        this many rows (at least one call and at most max_repeats)
+    random_state: int seed of the synthetic listings
+
+    Returns:
+    ========
+    report: dict
+        created, model (model_fingerprint), environment and results, a
+        list with one dict per batch size: batch_size, repeats,
+        rows_per_second, latency_p50_ms, latency_p99_ms, peak_memory_mb
+        and stages {stage: {mean_ms, p50_ms, p99_ms}}
+    """
+    listings = make_job_listings(max(batch_sizes), random_state)
+    # load the artifacts once, like a long-lived scoring process
+    score_data(listings.iloc[:1])
+
+    results = []
+    for batch_size in sorted(batch_sizes):
+        features = listings.iloc[:batch_size]
+        repeats = int(min(max_repeats, max(1, rows_per_size // batch_size)))
+
+        timings = pd.DataFrame([_score_stages(features) for _ in range(repeats)])
+        total = timings["total"]
+
+        results.append({"batch_size": batch_size,
+                        "repeats": repeats,
+                        "rows_per_second": batch_size * repeats / total.sum(),
+                        "latency_p50_ms": float(np.percentile(total, 50) * 1000),
+                        "latency_p99_ms": float(np.percentile(total, 99) * 1000),
+                        "peak_memory_mb": _peak_memory_mb(features),
+                        "stages": {stage: _latency_stats(timings[stage])
+                                   for stage in ["preprocess", "predict", "assemble"]}})
+
+    return {"created": datetime.now().strftime("%Y-%m-%d--%H-%M-%S"),
+            "model": model_fingerprint(),
+            "environment": environment_info(),
+            "results": results}
+
+def save_benchmark(report, name = "scoring"):
+    """
+    Saves a benchmark report as JSON in results/benchmarks
+
+    Parameters:
+    ===========
+    report: dict from benchmark_scoring
+    name: String prefix of the file name
+
+    Returns:
+    ========
+    filepath: String
+    """
+    PROJECT_ROOT_DIR = "."
+    folder_path = os.path.join(PROJECT_ROOT_DIR, "results", "benchmarks")
+    os.makedirs(folder_path, exist_ok = True)
+
+    filepath = os.path.join(folder_path, "{}_{}.json".format(name, report["created"]))
+    with open(filepath, "w") as file:
+        json.dump(report, file, indent = 2)
+    print("Benchmark Saved to {}".format(filepath))
+    return filepath
+
+def load_benchmark(filepath):
+    """
+    Returns:
+    ========
+    report: dict saved with save_benchmark
+    """
+    with open(filepath) as file:
+        return json.load(file)
+
+def benchmark_table(report):
+    """
+    Flattens the results of a report
+
+    Returns:
+    ========
+    table: DataFrame with one row per batch size
+    """
+    rows = []
+    for result in report["results"]:
+        row = {key: value for key, value in result.items() if key != "stages"}
+        for stage, stats in result.get("stages", {}).items():
+            row["{}_p50_ms".format(stage)] = stats["p50_ms"]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def compare_benchmarks(baseline, current, tolerance = 0.1):
+    """
+    Compares two benchmark reports batch size by batch size
+
+    Parameters:
+    ===========
+    baseline: dict report (or path of a saved report) of the reference version
+    current: dict report (or path of a saved report) of the new version
+    tolerance: float relative slowdown/memory growth reported as a regression
+
+    Returns:
+    ========
+    comparison: DataFrame [batch_size, rows_per_second_baseline,
+        rows_per_second_current, throughput_change, p99_change,
+        memory_change, regression]. Changes are relative (0.1 = +10%).
+    """
+    if isinstance(baseline, str):
+        baseline = load_benchmark(baseline)
+    if isinstance(current, str):
+        current = load_benchmark(current)
+
+    comparison = benchmark_table(baseline).merge(benchmark_table(current),
+                                                 on = "batch_size",
+                                                 suffixes = ("_baseline", "_current"))
+
+    for col, change in [("rows_per_second", "throughput_change"),
+                        ("latency_p99_ms", "p99_change"),
+                        ("peak_memory_mb", "memory_change")]:
+        comparison[change] = comparison[col + "_current"] / comparison[col + "_baseline"] - 1
+
+    comparison["regression"] = ((comparison["throughput_change"] < -tolerance)
+                                | (comparison["p99_change"] > tolerance)
+                                | (comparison["memory_change"] > tolerance))
+
+    if baseline["model"] != current["model"]:
+        print("Note: the reports were measured with different model files.")
+    return comparison[["batch_size", "rows_per_second_baseline", "rows_per_second_current",
+                       "throughput_change", "p99_change", "memory_change", "regression"]]
+
+def _benchmark_params(spec):
+    """
+    First value of every searched parameter of a training_plan family
+    """
+    grid = spec.get("param_grid", {})
+    return {param: values[0] for param, values in grid.items()}
+
+def benchmark_training(row_counts = [10000, 100000, 1000000], n_jobs_list = [1, 2, 4],
+                       families = None, cv = 5, random_state = 42):
+    """
+    Measures cross validation cost of the notebook 04 model families over
+    row counts and numbers of cores (shared_cv_mse_stats, the folds of
+    cv_mse_stats). Searched parameters are set to the first value of their
+    grid so every run trains the same model.
+
+    Parameters:
+    ===========
+    row_counts: list(int) number of training rows
+    n_jobs_list: list(int) number of folds fitted in parallel
+    families: list(String) names of training_plan families (all if None)
+    cv: int number of folds
+    random_state: int seed of the synthetic listings
+
+    Returns:
+    ========
+    report: dict
+        created, environment and results, a list with one dict per run:
+        family, rows, n_jobs, fit_time and predict_time (mean per fold in
+        seconds), wall_time (all folds), matrix_mb (feature matrix, shared
+        by the workers), fold_memory_mb (largest peak resident memory of 
+        one fold above the shared matrix), run_memory_mb (matrix_mb plus 
+        the folds running at the same time) and mse
+    """
+    plan = [spec for spec in training_plan() if families is None or spec["name"] in families]
+    listings = make_job_listings(max(row_counts), random_state, target = True)
+
+    results = []
+    for rows in sorted(row_counts):
+        features = listings.iloc[:rows].drop(["jobId", "companyId", "salary"], axis = 1)
+        target = listings["salary"].iloc[:rows]
+        matrices = build_features(features, {spec["features"] for spec in plan})
+
+        for spec in plan:
+            X = matrices[spec["features"]][1]
+            model = clone(spec["model"]).set_params(**_benchmark_params(spec))
+
+            # untimed run on a few rows: starts the workers and imports the model there
+            shared_cv_mse_stats(spec["name"], model, X[:100*cv], target.iloc[:100*cv],
+                                cv = cv, n_jobs = max(n_jobs_list))
+
+            for n_jobs in sorted(n_jobs_list):
+                start = time.perf_counter()
+                mse, timings = shared_cv_mse_stats(spec["name"], model, X, target, cv = cv, n_jobs = n_jobs)
+                wall_time = time.perf_counter() - start
+                matrix_mb = matrix_nbytes(X) / 1024**2
+                fold_memory = float(timings["peak_memory_mb"].max())
+
+                results.append({"family": spec["name"],
+                                "rows": rows,
+                                "n_jobs": n_jobs,
+                                "fit_time": float(timings["fit_time"].mean()),
+                                "predict_time": float(timings["score_time"].mean()),
+                                "wall_time": wall_time,
+                                "matrix_mb": matrix_mb,
+                                "fold_memory_mb": fold_memory,
+                                "run_memory_mb": matrix_mb + min(n_jobs, cv) * fold_memory,
+                                "mse": mse[1]})
+                print("{} rows={} n_jobs={}: {:.2f}s".format(spec["name"], rows, n_jobs, wall_time))
+
+    return {"created": datetime.now().strftime("%Y-%m-%d--%H-%M-%S"),
+            "environment": environment_info(),
+            "results": results}
+
+def scaling_table(report, value = "wall_time"):
+    """
+    Parameters:
+    ===========
+    report: dict from benchmark_training
+    value: String measured column (Ex: "fit_time", "run_memory_mb")
+
+    Returns:
+    ========
+    table: DataFrame of value with (family, rows) rows and n_jobs columns
+    """
+    return benchmark_table(report).pivot_table(index = ["family", "rows"],
+                                               columns = "n_jobs",
+                                               values = value)
+
+def plot_training_scaling(report):
+    """
+    Plots fit time against rows (single core) and wall time against cores
+    (largest row count) for each family
+    """
+    table = benchmark_table(report)
+    single_core = table[table["n_jobs"] == table["n_jobs"].min()]
+    largest = table[table["rows"] == table["rows"].max()]
+
+    plot_scaling(single_core, "rows", "fit_time", "family", "Training time vs rows")
+    plot_scaling(largest, "n_jobs", "wall_time", "family", "Training time vs cores", logx = False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Salary prediction scoring benchmark")
+    parser.add_argument("--max-rows", type = int, default = max(BATCH_SIZES))
+    parser.add_argument("--name", default = "scoring")
+    parser.add_argument("--compare", default = None, help = "report to compare the new report with")
+    parser.add_argument("--training", action = "store_true", help = "benchmark training instead of scoring")
+    args = parser.parse_args()
+
+    if args.training:
+        report = benchmark_training([rows for rows in [10000, 100000, 1000000] if rows <= args.max_rows])
+        save_benchmark(report, "training")
+        plot_training_scaling(report)
+        print(scaling_table(report).to_string())
+        sys.exit(0)
+
+    report = benchmark_scoring([size for size in BATCH_SIZES if size <= args.max_rows])
+    save_benchmark(report, args.name)
+    print(benchmark_table(report).to_string(index = False))
+
+    if args.compare is not None:
+        comparison = compare_benchmarks(args.compare, report)
+        print(comparison.to_string(index = False))
+        sys.exit(int(comparison["regression"].any()))
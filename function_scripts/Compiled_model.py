@@ -0,0 +1,217 @@
+# libraries
+import pandas as pd
+import numpy as np
+import os
+from itertools import product
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler, PolynomialFeatures
+from Deployment_helper import load_artifact
+
+"""
+Compiles the fitted polynomial pipeline + linear model into a lookup table.
+
+With one-hot categorical columns and scaled numeric columns, the polynomial
+model is a polynomial in the numeric columns whose coefficients only depend
+on the combination of categorical levels. The compiler precomputes those
+coefficients for every combination, so scoring is an integer index lookup
+and a few vectorized multiply-adds instead of building the polynomial
+design matrix.
+"""
+
+### Classes
+class compiled_polynomial_model():
+    """
+    Coefficient table of a polynomial linear model indexed by category codes
+
+    Parameters
+    ==========
+    cat_columns: list(String) of categorical columns
+    categories: list(array) of levels for each categorical column
+    num_columns: list(String) of numeric columns
+    offsets: array of values subtracted from the numeric columns
+    scales: array of values dividing the numeric columns
+    exponents: array(n_monomials, n_numeric) of numeric monomials
+    table: array(n_combinations, n_monomials) of monomial coefficients
+
+    Methods
+    =======
+    predict: predicts the target variable from raw features
+    """
+    def __init__(self, cat_columns, categories, num_columns, offsets, scales, exponents, table):
+        self.cat_columns = cat_columns
+        self.categories = categories
+        self.num_columns = num_columns
+        self.offsets = offsets
+        self.scales = scales
+        self.exponents = exponents
+        self.table = table
+
+    def combination_index(self, X):
+        """
+        Parameters:
+        ===========
+        X: dataframe of raw features
+
+        Returns:
+        ========
+        index: array(n_samples,) row of the coefficient table for each sample
+        """
+        codes = []
+        for col, levels in zip(self.cat_columns, self.categories):
+            col_codes = pd.Categorical(X[col], categories = levels).codes
+            if (col_codes < 0).any():
+                unknown = pd.unique(X[col][col_codes < 0])
+                raise ValueError("Found unknown categories {} in column '{}'.".format(list(unknown), col))
+            codes.append(col_codes)
+
+        dims = [len(levels) for levels in self.categories]
+        return np.ravel_multi_index(codes, dims)
+
+    def monomials(self, X):
+        """
+        Parameters:
+        ===========
+        X: dataframe of raw features
+
+        Returns:
+        ========
+        values: array(n_samples, n_monomials) of the numeric monomials
+        """
+        scaled = (X[self.num_columns].to_numpy(dtype = np.float64) - self.offsets) / self.scales
+        values = np.ones((len(X), len(self.exponents)))
+        for j, powers in enumerate(self.exponents):
+            for k, power in enumerate(powers):
+                if power:
+                    values[:, j] *= scaled[:, k] ** power
+        return values
+
+    def predict(self, X):
+        """
+        Parameters:
+        ===========
+        X: dataframe of raw features
+
+        Returns:
+        ========
+        predictions: Array, shape(n_samples,)
+        """
+        coefficients = self.table[self.combination_index(X)]
+        return np.einsum("ij,ij->i", coefficients, self.monomials(X))
+
+### Functions
+def _feature_blocks(preprocess, combos):
+    """
+    Splits the ColumnTransformer output into categorical and numeric blocks
+
+    Returns:
+    ========
+    one_hot: array(n_combinations, n_cat_features) one-hot part of the output
+    cat_index: list(int) output positions of the one-hot features
+    num_index: list(int) output positions of the numeric features
+    num_columns, offsets, scales: numeric columns and their scaling
+    """
+    one_hot, cat_index, num_index = [], [], []
+    num_columns, offsets, scales = [], [], []
+    position = 0
+
+    for name, transformer, columns in preprocess.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        if name == "remainder":
+            raise ValueError("Cannot compile remainder columns, please name every block.")
+        columns = list(columns)
+
+        if isinstance(transformer, OneHotEncoder):
+            block = transformer.transform(combos[columns])
+            block = block.toarray() if hasattr(block, "toarray") else np.asarray(block)
+            one_hot.append(block)
+            cat_index.extend(range(position, position + block.shape[1]))
+            position = position + block.shape[1]
+
+        elif isinstance(transformer, StandardScaler) or transformer == "passthrough":
+            n = len(columns)
+            mean = getattr(transformer, "mean_", None)
+            scale = getattr(transformer, "scale_", None)
+            offsets.extend(mean if mean is not None else np.zeros(n))
+            scales.extend(scale if scale is not None else np.ones(n))
+            num_columns.extend(columns)
+            num_index.extend(range(position, position + n))
+            position = position + n
+
+        else:
+            raise ValueError("Cannot compile transformer '{}' of type {}.".format(name, type(transformer).__name__))
+
+    return np.hstack(one_hot), cat_index, num_index, num_columns, np.array(offsets), np.array(scales)
+
+def compile_polynomial_model(pipeline, model):
+    """
+    Turns a fitted polynomial pipeline and linear model into a lookup table
+
+    Parameters:
+    ===========
+    pipeline: fitted Pipeline([ColumnTransformer, PolynomialFeatures])
+        ColumnTransformer made of OneHotEncoder and StandardScaler blocks
+    model: fitted linear model with coef_ and intercept_
+
+    Returns:
+    ========
+    compiled: compiled_polynomial_model
+    """
+    preprocess, poly = pipeline.steps[0][1], pipeline.steps[-1][1]
+    if len(pipeline.steps) != 2 or not isinstance(preprocess, ColumnTransformer) \
+       or not isinstance(poly, PolynomialFeatures):
+        raise ValueError("Please give a Pipeline of a ColumnTransformer and PolynomialFeatures.")
+
+    # every combination of categorical levels (C order for ravel_multi_index)
+    encoders = [(t, list(c)) for _, t, c in preprocess.transformers_ if isinstance(t, OneHotEncoder)]
+    cat_columns = [col for _, columns in encoders for col in columns]
+    categories = [np.asarray(levels) for encoder, _ in encoders for levels in encoder.categories_]
+    combos = pd.DataFrame(list(product(*categories)), columns = cat_columns)
+
+    one_hot, cat_index, num_index, num_columns, offsets, scales = _feature_blocks(preprocess, combos)
+
+    # split each polynomial feature into its categorical and numeric part
+    powers = poly.powers_
+    exponents, monomial = np.unique(powers[:, num_index], axis = 0, return_inverse = True)
+    monomial = monomial.ravel()
+
+    # one-hot values are 0/1, so a categorical part is 1 only if all its columns are 1
+    support = (powers[:, cat_index] > 0).astype(np.float64)
+    cat_factor = (one_hot @ support.T == support.sum(axis = 1)).astype(np.float64)
+
+    # sum coefficients of features that share a numeric monomial
+    coef = np.ravel(model.coef_)
+    grouping = np.zeros((len(coef), len(exponents)))
+    grouping[np.arange(len(coef)), monomial] = coef
+    table = cat_factor @ grouping
+
+    constant = np.flatnonzero(exponents.sum(axis = 1) == 0)[0]
+    table[:, constant] += np.ravel(model.intercept_)[0]
+
+    return compiled_polynomial_model(cat_columns, categories, num_columns,
+                                     offsets, scales, exponents, table)
+
+def compiled_score_data(data, model_name = "compiled_model"):
+    """
+    Generates predictions with a compiled model saved in the model folder
+    (results.save_model(compiled, "compiled_model"))
+
+    Parameters:
+    ===========
+    data: DataFrame
+        raw data
+
+    Returns:
+    ========
+    results: DataFrame [jobId, predicted_salary]
+    """
+    try:
+        PROJECT_ROOT_DIR = "."
+        model_path = os.path.join(PROJECT_ROOT_DIR, "model", model_name + ".pkl")
+        compiled = load_artifact(model_path)
+
+    except OSError:
+        raise ValueError("There is no '{}.pkl'. Please compile and save model.".format(model_name))
+
+    predictions = compiled.predict(data)
+    return pd.DataFrame({"jobId": data["jobId"], "predicted_salary": predictions})
@@ -0,0 +1,162 @@
+# libraries
+import os
+import argparse
+import warnings
+import matplotlib
+import matplotlib.pyplot as plt
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import EDA_helper_functions as eda
+from EDA_helper_functions import build_cube, eda_figure_key
+from data_import_functions import get_data, categorical_columns, integer_columns, column_fingerprints
+from results import figure_is_current, record_figure
+
+"""
+Renders the figures of notebook 01 (num_eda, target_num_eda, cat_eda,
+interaction_plots and corr_heat_map) on a process pool.
+
+The data is aggregated once into an aggregate_cube. Each worker gets the
+cube and the frame once, through the pool initializer, and the tasks only
+carry the figure options. In summary mode that frame is empty (the columns of the
+data, not the rows) and the figures are drawn from the cube. Each figure has
+the eda_figure_key the plot functions use in the notebook, so a figure is
+skipped when its key matches the one in images/manifest.json, whichever of
+the two drew it last.
+
+Run from the project root (the folder holding "data"):
+    python function_scripts/EDA_report.py --n-jobs 4
+"""
+
+# frame and cube of a worker process, set once by the pool initializer
+_worker_data = None
+_worker_cube = None
+
+### Functions
+def _init_worker(data, cube):
+    global _worker_data, _worker_cube
+    _worker_data, _worker_cube = data, cube
+    
+    # non-interactive backend, plt.show() becomes a no-op
+    plt.switch_backend("Agg")
+    warnings.filterwarnings("ignore", message = ".*non-interactive.*")
+
+def _render_figure(function, kwargs):
+    """
+    Draws and saves one figure from the worker frame and cube, then closes
+    every open figure
+    """
+    try:
+        getattr(eda, function)(data = _worker_data, cube = _worker_cube, **kwargs)
+    finally:
+        plt.close("all")
+
+def report_figures(data, target_col = "salary", summary = True, max_fliers = 50):
+    """
+    Lists the figures of the report with their manifest keys
+
+    Parameters:
+    ===========
+    data: training dataframe
+    target_col: name of dependent variable
+    summary: Boolean draws boxplots and histograms from the cube counts
+    max_fliers: int maximum number of outlier markers per box
+
+    Returns:
+    ========
+    figures: list of (figure name, plot function name, kwargs, key), the
+        kwargs do not hold the data and cube (each worker has its own)
+    """
+    # the workers only draw and save, this runner records the keys
+    options = {"summary": summary, "max_fliers": max_fliers}
+    num_variables = integer_columns(data).drop(target_col)
+    cat_variables = categorical_columns(data).drop(["jobId", "companyId"])
+    fingerprints = column_fingerprints(data, list(data.columns.drop(["jobId", "companyId"])))
+
+    figures = []
+    def add(fig_name, function, kwargs):
+        key = eda_figure_key(function, data, fingerprints, **kwargs)
+        figures.append((fig_name, function, dict(kwargs, cache = False), key))
+
+    for col in num_variables:
+        add("num_eda_plot_{}".format(col), "num_eda_plots",
+            dict(options, col = col, target_col = target_col))
+
+    add("target_eda_plot_{}".format(target_col), "target_num_eda",
+        dict(options, target_col = target_col))
+
+    for col in cat_variables:
+        add("cat_eda_plot_{}".format(col), "cat_eda_plot",
+            dict(options, col = col, target_col = target_col))
+
+    for col in cat_variables:
+        add("cat_num_interaction_plots_{}".format(col), "cat_num_interaction_plots",
+            dict(options, cat_var = col))
+
+    for cat_var_1, cat_var_2 in combinations(cat_variables, 2):
+        add("cat_cat_interaction_plot_{}_{}".format(cat_var_1, cat_var_2), "cat_cat_interaction_plot",
+            {"cat_var_1": cat_var_1, "cat_var_2": cat_var_2})
+
+    add("corr_heat_map", "corr_heat_map", {"target_col": target_col})
+    return figures
+
+def run_eda_report(data, target_col = "salary", n_jobs = -1, summary = True, max_fliers = 50,
+                   force = False):
+    """
+    Renders the EDA report in parallel, skipping unchanged figures
+
+    Parameters:
+    ===========
+    data: training dataframe
+    target_col: name of dependent variable
+    n_jobs: int number of worker processes (all CPUs if -1, at most the
+        number of CPUs)
+    summary: Boolean draws boxplots and histograms from the cube counts
+    max_fliers: int maximum number of outlier markers per box
+    force: Boolean renders every figure
+
+    Returns:
+    ========
+    rendered: list(String) names of the figures drawn in this run
+    """
+    # same convention as scikit-learn: -1 is every CPU, 0 and other negatives are errors
+    if not isinstance(n_jobs, int) or n_jobs == 0 or n_jobs < -1:
+        raise ValueError("n_jobs must be a positive int or -1, got {!r}.".format(n_jobs))
+    n_cpus = os.cpu_count() or 1
+    n_workers = n_cpus if n_jobs == -1 else min(n_jobs, n_cpus)
+    
+    figures = report_figures(data, target_col, summary, max_fliers)
+    n_figures = len(figures)
+    figures = [figure for figure in figures if force or not figure_is_current(figure[0], figure[3])]
+
+    rendered = []
+    if not figures:
+        print("0 figures drawn, {} unchanged".format(n_figures))
+        return rendered
+
+    cube = build_cube(data, target_col)
+    frame = data.iloc[:0] if summary else data
+    with ProcessPoolExecutor(max_workers = n_workers, initializer = _init_worker, 
+                             initargs = (frame, cube)) as executor:
+        futures = {executor.submit(_render_figure, function, kwargs): (fig_name, key)
+                   for fig_name, function, kwargs, key in figures}
+
+        for future in as_completed(futures):
+            fig_name, key = futures[future]
+            future.result()
+            record_figure(fig_name, key)
+            rendered.append(fig_name)
+
+    print("{} figures drawn, {} unchanged".format(len(rendered), n_figures - len(rendered)))
+    return rendered
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    parser = argparse.ArgumentParser(description = "Salary prediction EDA report")
+    parser.add_argument("--n-jobs", type = int, default = -1)
+    parser.add_argument("--max-fliers", type = int, default = 50)
+    parser.add_argument("--raw", action = "store_true", help = "draw boxplots from the raw rows")
+    parser.add_argument("--force", action = "store_true")
+    args = parser.parse_args()
+
+    data = get_data("train", key = "jobId", target_variable = "salary", remove_zeros = True)
+    run_eda_report(data, "salary", args.n_jobs, not args.raw, args.max_fliers, args.force)
@@ -0,0 +1,301 @@
+###### libraries ################################################
+import numpy as np
+import pandas as pd
+from itertools import islice, zip_longest
+from scipy import sparse
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.model_selection import check_cv
+from sklearn.linear_model import LinearRegression, Ridge
+from results import search_results
+
+"""
+Least squares models fitted from sufficient statistics (Gram matrices).
+
+The statistics of a set of rows (n, sums, X'X, X'y, y'y) can be added and
+subtracted, so the statistics of every training fold are the totals minus
+the held out fold, and the Ridge solution for any alpha follows from one
+eigendecomposition of the centered X'X.
+"""
+
+###### Classes and Functions #################################################
+class gram_statistics():
+    """
+    Sufficient statistics of a linear least squares problem
+
+    Parameters
+    ==========
+    n_features: int number of columns of X
+
+    Methods
+    =======
+    update: adds the statistics of a batch of rows
+    centered: returns the centered Gram matrix and cross products
+    solve: returns coef and intercept of Ridge (alpha > 0) or least squares
+    mse: mean squared error of a linear model on the rows of the statistics
+    """
+    def __init__(self, n_features):
+        self.n = 0
+        self.sum_x = np.zeros(n_features)
+        self.sum_y = 0.0
+        self.sum_yy = 0.0
+        self.xtx = np.zeros((n_features, n_features))
+        self.xty = np.zeros(n_features)
+
+    def update(self, X, y):
+        """
+        Parameters:
+        ===========
+        X: array or sparse matrix of features
+        y: dataframe or 1-D array with target values
+        """
+        y = np.asarray(y, dtype = np.float64).ravel()
+        if sparse.issparse(X):
+            X = X.tocsr()
+            xtx = (X.T @ X).toarray()
+        else:
+            X = np.asarray(X, dtype = np.float64)
+            xtx = X.T @ X
+
+        self.n = self.n + len(y)
+        self.sum_x += np.asarray(X.sum(axis = 0), dtype = np.float64).ravel()
+        self.sum_y += y.sum()
+        self.sum_yy += y @ y
+        self.xtx += xtx
+        self.xty += np.asarray(X.T @ y, dtype = np.float64).ravel()
+        return self
+
+    def _combine(self, other, sign):
+        combined = gram_statistics(len(self.sum_x))
+        combined.n = self.n + sign * other.n
+        for attribute in ["sum_x", "sum_y", "sum_yy", "xtx", "xty"]:
+            setattr(combined, attribute, getattr(self, attribute) + sign * getattr(other, attribute))
+        return combined
+
+    def __add__(self, other):
+        return self._combine(other, 1)
+
+    def __sub__(self, other):
+        return self._combine(other, -1)
+
+    def centered(self):
+        """
+        Returns:
+        ========
+        gram: array(n_features, n_features) centered X'X
+        cross: array(n_features,) centered X'y
+        x_mean: array(n_features,) column means
+        y_mean: float target mean
+        """
+        x_mean = self.sum_x / self.n
+        y_mean = self.sum_y / self.n
+        gram = self.xtx - self.n * np.outer(x_mean, x_mean)
+        cross = self.xty - self.n * x_mean * y_mean
+        return gram, cross, x_mean, y_mean
+
+    def solve(self, alpha = 0.0, rcond = 1e-12):
+        """
+        Parameters:
+        ===========
+        alpha: float
+            Ridge penalty (0 gives the minimum norm least squares solution
+            like LinearRegression)
+        rcond: float
+            relative cutoff of small eigenvalues when alpha = 0
+
+        Returns:
+        ========
+        coef: array(n_features,)
+        intercept: float
+        """
+        gram, cross, x_mean, y_mean = self.centered()
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        coef = eigenvectors @ (_inverse_spectrum(eigenvalues, alpha, rcond) * (eigenvectors.T @ cross))
+        return coef, y_mean - x_mean @ coef
+
+    def mse(self, coef, intercept):
+        """
+        Mean squared error of predictions X @ coef + intercept computed from
+        the statistics (no pass over the rows)
+
+        Returns:
+        ========
+        mse: float
+        """
+        sse = (self.sum_yy
+               - 2 * coef @ self.xty
+               - 2 * intercept * self.sum_y
+               + coef @ self.xtx @ coef
+               + 2 * intercept * coef @ self.sum_x
+               + self.n * intercept ** 2)
+        return sse / self.n
+
+def _inverse_spectrum(eigenvalues, alpha, rcond = 1e-12):
+    """
+    1 / (eigenvalue + alpha), with a pseudo-inverse cutoff when alpha = 0
+    """
+    shifted = eigenvalues + alpha
+    cutoff = rcond * max(eigenvalues.max(), 0) if alpha == 0 else 0
+    return np.where(shifted > cutoff, 1 / np.where(shifted > cutoff, shifted, 1), 0)
+
+def _fold_statistics(X, y, cv, transform_cache):
+    """
+    Train/test statistics of every cross validation fold
+    """
+    if transform_cache is not None:
+        # each fold has its own fitted transformer
+        folds = []
+        for X_train, X_test, y_train, y_test in transform_cache.folds(X, y):
+            train = gram_statistics(X_train.shape[1]).update(X_train, y_train)
+            test = gram_statistics(X_test.shape[1]).update(X_test, y_test)
+            folds.append((train, test))
+        return folds
+
+    # one pass: test statistics per fold, training statistics by subtraction
+    y = np.asarray(y, dtype = np.float64).ravel()
+    if sparse.issparse(X):
+        X = X.tocsr()
+    tests = [gram_statistics(X.shape[1]).update(X[test_index], y[test_index])
+             for _, test_index in check_cv(cv).split(X, y)]
+    total = sum(tests[1:], tests[0])
+    return [(total - test, test) for test in tests]
+
+def ridge_path_search(X, y, alphas, cv = 5, transform_cache = None):
+    """
+    Cross validated MSE of Ridge for many alphas. X'X of each training fold
+    is eigendecomposed once, after which every alpha costs O(n_features^2)
+    instead of a refit.
+
+    Parameters:
+    ===========
+    X: array or sparse matrix of features (raw Dataframe if transform_cache is given)
+    y: dataframe or 1-D array with target values
+    alphas: list of Ridge penalties
+    cv: int or sklearn splitter (cv = 5 gives the GridSearchCV folds)
+    transform_cache: Preprocessing.fold_transform_cache
+
+    Returns:
+    ========
+    search: search_results (usable with display_search_results)
+    """
+    folds = _fold_statistics(X, y, cv, transform_cache)
+    fold_scores = np.zeros((len(alphas), len(folds)))
+
+    for j, (train, test) in enumerate(folds):
+        gram, cross, x_mean, y_mean = train.centered()
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        projected = eigenvectors.T @ cross
+
+        for i, alpha in enumerate(alphas):
+            coef = eigenvectors @ (_inverse_spectrum(eigenvalues, alpha) * projected)
+            intercept = y_mean - x_mean @ coef
+            fold_scores[i, j] = -1*test.mse(coef, intercept)
+
+    return search_results([{"alpha": alpha} for alpha in alphas], fold_scores)
+
+def frame_chunks(features, target, chunksize = 100000):
+    """
+    Splits features and target into row chunks
+    
+    Parameters:
+    ===========
+    features: dataframe of raw features
+    target: series or 1-D array with target values
+    chunksize: int number of rows per chunk
+    
+    Returns:
+    ========
+    chunks: generator of (features, target)
+    """
+    target = np.asarray(target)
+    for start in range(0, len(features), chunksize):
+        yield features.iloc[start:start + chunksize], target[start:start + chunksize]
+
+def csv_chunks(features_path, target_path, key = "jobId", target_variable = "salary", 
+               chunksize = 100000, remove_zeros = True):
+    """
+    Reads the features and target csv files (Ex: train_features.csv and 
+    train_salaries.csv) in row chunks without loading them in memory
+    
+    Parameters:
+    ===========
+    features_path: String
+    target_path: String
+    key: String common id column, both files must list the same ids in the same order
+    target_variable: String
+    chunksize: int number of rows per chunk
+    remove_zeros: Boolean removes rows with a target of 0 (like get_data)
+    
+    Returns:
+    ========
+    chunks: generator of (features, target)
+    """
+    features_reader = pd.read_csv(features_path, chunksize = chunksize)
+    target_reader = pd.read_csv(target_path, chunksize = chunksize)
+    
+    for features, target in zip_longest(features_reader, target_reader):
+        # a file running out first would silently drop the extra rows of the other
+        if features is None or target is None:
+            raise ValueError("{} and {} do not have the same number of rows.".format(features_path, target_path))
+        if not features[key].equals(target[key]):
+            raise ValueError("The rows of {} and {} are not aligned on '{}'.".format(features_path, target_path, key))
+        
+        if remove_zeros:
+            non_zero = (target[target_variable] != 0).to_numpy()
+            features, target = features[non_zero], target[non_zero]
+        yield features, target[target_variable].to_numpy()
+
+def _chunk_statistics(pipeline, features, target):
+    """
+    Statistics of one chunk of raw rows
+    """
+    X = pipeline.transform(features)
+    return gram_statistics(X.shape[1]).update(X, target)
+
+def gram_fit(pipeline, chunks, alpha = 0.0, n_jobs = 1, statistics = None):
+    """
+    Out-of-core training of a linear model on the pipeline features. Row 
+    chunks are transformed and reduced to X'X and X'y on parallel workers,
+    then the normal equations are solved once, so memory is O(p^2) instead
+    of O(n*p).
+    
+    Note: the pipeline must be fitted beforehand (a sample containing every
+    category is enough). Least squares predictions do not depend on the
+    StandardScaler means/scales because the polynomial features span the same
+    space for any scaling of the numeric columns.
+    
+    Parameters:
+    ===========
+    pipeline: fitted feature pipeline (Ex: polynomial_pipeline)
+    chunks: iterable of (features, target) (Ex: frame_chunks, csv_chunks)
+    alpha: float Ridge penalty (0 gives LinearRegression)
+    n_jobs: int number of workers
+    statistics: gram_statistics of previous rows to fold the new rows into
+    
+    Returns:
+    ========
+    model: fitted LinearRegression or Ridge
+    statistics: gram_statistics of all rows seen
+    """
+    chunks = iter(chunks)
+    batch_size = 2 * effective_n_jobs(n_jobs)
+    
+    with Parallel(n_jobs = n_jobs) as parallel:
+        while True:
+            # a few chunks at a time so only a few p x p matrices are alive
+            batch = list(islice(chunks, batch_size))
+            if not batch:
+                break
+            
+            for chunk_statistics in parallel(delayed(_chunk_statistics)(pipeline, features, target) 
+                                             for features, target in batch):
+                statistics = chunk_statistics if statistics is None else statistics + chunk_statistics
+    
+    if statistics is None:
+        raise ValueError("There are no rows to fit.")
+    
+    coef, intercept = statistics.solve(alpha)
+    model = LinearRegression() if alpha == 0 else Ridge(alpha = alpha)
+    model.coef_ = coef
+    model.intercept_ = intercept
+    model.n_features_in_ = len(coef)
+    return model, statistics
@@ -0,0 +1,354 @@
+# libraries
+import pandas as pd
+import numpy as np
+import io
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Deployment_helper import load_scoring_artifacts, score_data
+
+"""
+Long-lived HTTP scoring service built on the deployment pipeline.
+
+Endpoints
+=========
+POST /predict: single listing (JSON object), batch (JSON list or csv)
+GET  /stats:   latency percentiles and throughput
+GET  /health:  liveness check
+
+Run from the project root (the folder holding "model"):
+    python function_scripts/Prediction_service.py --port 8000
+"""
+
+### Classes
+class service_stats():
+    """
+    Thread-safe record of request latencies and throughput
+
+    Methods
+    =======
+    record: stores the latency and row count of a request
+    record_batch: counts a scored batch
+    summary: returns latency percentiles and throughput
+    """
+    def __init__(self, window = 10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen = window)
+        self.start_time = time.time()
+        self.n_requests = 0
+        self.n_rows = 0
+        self.n_batches = 0
+        self.n_errors = 0
+
+    def record(self, latency, n_rows, error = False):
+        with self.lock:
+            self.latencies.append(latency)
+            self.n_requests = self.n_requests + 1
+            self.n_rows = self.n_rows + n_rows
+            self.n_errors = self.n_errors + int(error)
+
+    def record_batch(self):
+        with self.lock:
+            self.n_batches = self.n_batches + 1
+
+    def summary(self):
+        """
+        Returns:
+        ========
+        stats: dict
+            latency percentiles in ms and throughput since start up
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            uptime = time.time() - self.start_time
+            stats = {"uptime_seconds": round(uptime, 3),
+                     "requests": self.n_requests,
+                     "rows": self.n_rows,
+                     "batches": self.n_batches,
+                     "errors": self.n_errors,
+                     "requests_per_second": self.n_requests / uptime,
+                     "rows_per_second": self.n_rows / uptime,
+                     "mean_requests_per_batch": self.n_requests / max(self.n_batches, 1)}
+
+        for q in [50, 90, 99]:
+            value = float(np.percentile(latencies, q)) if len(latencies) else None
+            stats["latency_p{}_ms".format(q)] = value
+        return stats
+
+class micro_batcher():
+    """
+    Collects concurrent requests and scores them with a single predict call
+
+    Parameters
+    ==========
+    max_batch_rows: maximum number of rows scored together
+    max_wait_ms: maximum time the first request of a batch waits for others
+
+    Methods
+    =======
+    submit: blocks until the rows of one request are scored
+    """
+    def __init__(self, stats, max_batch_rows = 4096, max_wait_ms = 5):
+        self.stats = stats
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target = self._run, daemon = True)
+        self.worker.start()
+
+    def submit(self, features):
+        """
+        Parameters:
+        ===========
+        features: DataFrame
+            raw data of one request
+
+        Returns:
+        ========
+        results: DataFrame [jobId, predicted_salary]
+        """
+        request = {"features": features, "done": threading.Event()}
+        self.requests.put(request)
+        request["done"].wait()
+
+        if "error" in request:
+            raise request["error"]
+        return request["result"]
+
+    def _collect(self):
+        # block for the first request, then gather more until full or timed out
+        batch = [self.requests.get()]
+        n_rows = len(batch[0]["features"])
+        deadline = time.time() + self.max_wait
+
+        while n_rows < self.max_batch_rows:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout = timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_rows = n_rows + len(request["features"])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.stats.record_batch()
+            try:
+                # one vectorized predict call for the whole batch
+                features = pd.concat([request["features"] for request in batch],
+                                     ignore_index = True)
+                predictions = score_data(features)
+
+                start = 0
+                for request in batch:
+                    stop = start + len(request["features"])
+                    request["result"] = predictions.iloc[start:stop]
+                    start = stop
+
+            except Exception:
+                # score requests one by one so a bad request does not fail the batch
+                for request in batch:
+                    try:
+                        request["result"] = score_data(request["features"])
+                    except Exception as error:
+                        request["error"] = error
+
+            for request in batch:
+                request["done"].set()
+
+class prediction_handler(BaseHTTPRequestHandler):
+    """
+    Request handler of the scoring server. The server holds the micro
+    batcher and the stats.
+    """
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send(200, json.dumps(self.server.stats.summary()))
+        elif self.path == "/health":
+            self._send(200, json.dumps({"status": "ok"}))
+        else:
+            self._send(404, json.dumps({"error": "Unknown endpoint."}))
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, json.dumps({"error": "Unknown endpoint."}))
+            return
+
+        start = time.time()
+        n_rows = 0
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length).decode("utf-8")
+            content_type = self.headers.get("Content-Type", "application/json")
+            is_csv = "csv" in content_type
+
+            features = parse_listings(body, is_csv, self.server.columns)
+            n_rows = len(features)
+        except (ValueError, TypeError) as error:
+            # malformed body or listings without the model columns
+            self._send_error(400, error, start, n_rows)
+            return
+
+        try:
+            predictions = self.server.batcher.submit(features)
+
+            if is_csv:
+                self._send(200, predictions.to_csv(index = False), "text/csv")
+            else:
+                payload = {"predictions": predictions.to_dict(orient = "records")}
+                self._send(200, json.dumps(payload))
+            self.server.stats.record(time.time() - start, n_rows)
+
+        except Exception as error:
+            self._send_error(*scoring_error(error), start, n_rows)
+
+    def _send_error(self, code, error, start, n_rows):
+        self._send(code, json.dumps({"error": str(error)}))
+        self.server.stats.record(time.time() - start, n_rows, error = True)
+
+    def _send(self, code, body, content_type = "application/json"):
+        body = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the console quiet, stats are available on /stats
+        pass
+
+class prediction_server(ThreadingHTTPServer):
+    """
+    Threaded HTTP server with a listen backlog large enough for bursts of
+    concurrent clients
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+### Functions
+def parse_listings(body, is_csv = False, columns = None):
+    """
+    Turns a request body into raw data for the deployment pipeline
+
+    Parameters:
+    ===========
+    body: String
+        JSON object (single listing), JSON list, {"listings": [...]} or csv
+
+    is_csv: Boolean
+        body is a csv with a header row
+        
+    columns: list(String)
+        columns the pipeline needs, a ValueError names the missing ones
+
+    Returns:
+    ========
+    features: DataFrame
+        raw data
+    """
+    if is_csv:
+        features = pd.read_csv(io.StringIO(body))
+    else:
+        listings = json.loads(body)
+        if isinstance(listings, dict):
+            listings = listings.get("listings", [listings])
+        features = pd.DataFrame(listings)
+
+    if "jobId" not in features.columns:
+        raise ValueError("Every listing needs a 'jobId'.")
+    
+    missing = [col for col in (columns if columns is not None else []) if col not in features.columns]
+    if missing:
+        raise ValueError("The listings miss the columns {}.".format(missing))
+
+    # companyId is not used by the model
+    if "companyId" not in features.columns:
+        features["companyId"] = None
+    return features
+
+def scoring_error(error):
+    """
+    HTTP status of a request that failed while scoring
+    
+    Parameters:
+    ===========
+    error: Exception raised by score_data
+    
+    Returns:
+    ========
+    code: int
+        400 when the pipeline rejects the listing values (Ex: unknown 
+        levels, text in numeric columns), 500 for server-side failures 
+        (Ex: missing or unreadable artifacts, out of memory)
+    error: Exception reported to the client (the artifact error if an
+        artifact cannot be loaded)
+    """
+    # pandas and sklearn reject bad values with these errors, unless the 
+    # artifacts themselves are the problem
+    try:
+        load_scoring_artifacts()
+    except ValueError as artifact_error:
+        return 500, artifact_error
+    
+    if isinstance(error, (ValueError, KeyError, TypeError)):
+        return 400, error
+    return 500, error
+
+def make_server(host = "127.0.0.1", port = 8000, max_batch_rows = 4096, max_wait_ms = 5):
+    """
+    Loads the pipeline and model once and creates the scoring server
+
+    Parameters:
+    ===========
+    host: String
+    port: int
+    max_batch_rows: int
+        maximum number of rows scored in one predict call
+    max_wait_ms: float
+        time a request waits for others to share its predict call
+
+    Returns:
+    ========
+    server: prediction_server
+    """
+    # load artifacts at start up, requests reuse the cached objects
+    pipeline, model = load_scoring_artifacts()
+
+    server = prediction_server((host, port), prediction_handler)
+    # raw columns the pipeline was fitted on (None if it did not record them)
+    server.columns = getattr(pipeline, "feature_names_in_", None)
+    server.stats = service_stats()
+    server.batcher = micro_batcher(server.stats, max_batch_rows, max_wait_ms)
+    return server
+
+def run_server(host = "127.0.0.1", port = 8000, max_batch_rows = 4096, max_wait_ms = 5):
+    """
+    Starts the scoring server and serves until interrupted
+    """
+    server = make_server(host, port, max_batch_rows, max_wait_ms)
+    print("Serving predictions on http://{}:{}".format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Salary prediction server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--max-batch-rows", type = int, default = 4096)
+    parser.add_argument("--max-wait-ms", type = float, default = 5)
+    args = parser.parse_args()
+
+    run_server(args.host, args.port, args.max_batch_rows, args.max_wait_ms)
@@ -1,8 +1,23 @@
 # libraries
-from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.base import BaseEstimator, TransformerMixin, clone
 import numpy as np
-from sklearn.model_selection import cross_val_score
+import pandas as pd
+import os
+import gc
+import time
+import ctypes
+import shutil
+import tempfile
+import joblib
+from scipy import sparse
+from joblib import Parallel, delayed
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, PolynomialFeatures
+from sklearn.model_selection import cross_val_score, check_cv, ParameterGrid, ParameterSampler
+from sklearn.metrics import mean_squared_error
 from statistics import mean, stdev
+from results import search_results
 
 # class
 class change_variables(BaseEstimator, TransformerMixin):
@@ -40,7 +55,8 @@ class change_variables(BaseEstimator, TransformerMixin):
         
         # interactions between major and industry
         if self.interactions:
-            X_copy["major_industry"] = X_copy["major"] + "_" + X_copy["industry"]
+            # as strings, category columns do not support "+"
+            X_copy["major_industry"] = X_copy["major"].astype(str) + "_" + X_copy["industry"].astype(str)
         
         # return dataframe result
         if self.cols_to_delete == None:
@@ -50,14 +66,236 @@ class change_variables(BaseEstimator, TransformerMixin):
 class to_dense_mat(BaseEstimator, TransformerMixin):
     """
     class to return a desnse matrix for subsequent PCA
+    
+    Note: only add it to a pipeline when an estimator cannot take sparse
+    input, the dense matrix of one-hot features is mostly zeros
     """
     def fit(self, X, y = None):
         return self
    
     def transform(self, X, y = None):
-        return X.todense()   
+        if sparse.issparse(X):
+            return X.todense()
+        return X
+
+def feature_pipeline(cat_var, num_var, degree = 1, dense = False):
+    """
+    Creates the one-hot + scaling pipeline with an optional polynomial
+    expansion. The output is a CSR matrix, PolynomialFeatures keeps the
+    sparse format so the zeros of the one-hot blocks are never stored.
+    
+    Parameters:
+    ===========
+    cat_var: list(String) of categorical columns
+    num_var: list(String) of numeric columns
+    degree: int
+        degree of the polynomial features (1 means no expansion)
+    dense: Boolean
+        explicit opt-in to return a dense matrix through to_dense_mat
+    
+    Returns:
+    ========
+    pipeline: Pipeline
+    """
+    steps = [("preprocess", ColumnTransformer([
+                 ("cat", OneHotEncoder(drop = "first"), cat_var),
+                 ("num", StandardScaler(), num_var)
+             ], sparse_threshold = 1.0))]
+    
+    if degree > 1:
+        steps.append(("polynomial", PolynomialFeatures(degree = degree)))
+    if dense:
+        steps.append(("dense", to_dense_mat()))
+    return Pipeline(steps)
+
+def tree_pipeline(cat_var, num_var = None, dense = False):
+    """
+    Creates the one-hot pipeline for tree models. Numeric columns are passed
+    through untouched. RandomForestRegressor and XGBRegressor both accept
+    the sparse output.
+    
+    Parameters:
+    ===========
+    cat_var: list(String) of categorical columns
+    num_var: list(String) of numeric columns
+        other columns are dropped (Ex: jobId at deployment). All other 
+        columns are passed through if None.
+    dense: Boolean
+        explicit opt-in to return a dense matrix through to_dense_mat
+    
+    Returns:
+    ========
+    pipeline: Pipeline
+    """
+    if num_var is None:
+        blocks, remainder = [("cat", OneHotEncoder(drop = "first"), cat_var)], "passthrough"
+    else:
+        blocks, remainder = [("cat", OneHotEncoder(drop = "first"), cat_var),
+                             ("num", "passthrough", num_var)], "drop"
+    
+    steps = [("preprocess", ColumnTransformer(blocks, 
+                                              remainder = remainder, 
+                                              sparse_threshold = 1.0))]
+    
+    if dense:
+        steps.append(("dense", to_dense_mat()))
+    return Pipeline(steps)
+
+def matrix_nbytes(X):
+    """
+    Memory used by a dense or sparse feature matrix
+    
+    Parameters:
+    ===========
+    X: array or sparse matrix
+    
+    Returns:
+    ========
+    nbytes: int
+    """
+    if sparse.issparse(X):
+        X = X.tocsr()
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return np.asarray(X).nbytes
+
+def save_matrix(X, path):
+    """
+    Saves a dense or sparse matrix as .npy files that can be memory-mapped
+    
+    Parameters:
+    ===========
+    X: array or sparse matrix
+    path: String
+        file path without extension
+    """
+    if sparse.issparse(X):
+        X = X.tocsr()
+        for part in ["data", "indices", "indptr"]:
+            np.save("{}.{}.npy".format(path, part), getattr(X, part))
+        np.save("{}.shape.npy".format(path), np.array(X.shape))
+    else:
+        np.save("{}.npy".format(path), np.asarray(X))
+
+def load_matrix(path):
+    """
+    Loads a matrix saved with save_matrix as a read-only memory map
+    
+    Parameters:
+    ===========
+    path: String
+        file path without extension
+    
+    Returns:
+    ========
+    X: memory-mapped array or csr_matrix over memory-mapped arrays
+    """
+    if os.path.exists("{}.npy".format(path)):
+        return np.load("{}.npy".format(path), mmap_mode = "r")
+    
+    parts = [np.load("{}.{}.npy".format(path, part), mmap_mode = "r") 
+             for part in ["data", "indices", "indptr"]]
+    shape = tuple(np.load("{}.shape.npy".format(path)))
+    return sparse.csr_matrix(tuple(parts), shape = shape, copy = False)
+
+class fold_transform_cache():
+    """
+    Fits a transformer once per cross validation fold and keeps the 
+    transformed train/test matrices on disk as memory maps, so every model
+    and hyperparameter candidate evaluated on the folds reuses them
+    
+    Parameters
+    ==========
+    transformer: unfitted sklearn transformer or pipeline (Ex: polynomial_pipeline)
+    cv: int or sklearn splitter (same folds as cv_mse_stats for cv = 5)
+    cache_dir: String folder of the cache
+    
+    Methods
+    =======
+    folds: yields (X_train, X_test, y_train, y_test) of every fold
+    """
+    def __init__(self, transformer, cv = 5, cache_dir = "cache/folds"):
+        self.transformer = transformer
+        self.cv = cv
+        self.cache_dir = cache_dir
+        
+    def key(self, X, y, splits):
+        """
+        Fingerprint of the transformer, data and fold indices (a shuffling 
+        splitter without random_state gives new folds, so a new key)
+        """
+        data_hash = pd.util.hash_pandas_object(X, index = False).to_numpy()
+        return joblib.hash([self.transformer, data_hash, np.asarray(y), splits])
+        
+    def folds(self, X, y):
+        """
+        Parameters:
+        ===========
+        X: Dataframe of raw features
+        y: Dataframe or Array of target values
+        
+        Returns:
+        ========
+        folds: generator of (X_train, X_test, y_train, y_test)
+        """
+        y = np.asarray(y)
+        splits = list(check_cv(self.cv).split(X, y))
+        folder = os.path.join(self.cache_dir, self.key(X, y, splits))
+        os.makedirs(folder, exist_ok = True)
+        
+        for i, (train_index, test_index) in enumerate(splits):
+            path = os.path.join(folder, "fold_{}".format(i))
+            
+            # fit the transformer of the fold only once
+            if not os.path.exists(path + ".done"):
+                transformer = clone(self.transformer)
+                save_matrix(transformer.fit_transform(X.iloc[train_index]), path + "_train")
+                save_matrix(transformer.transform(X.iloc[test_index]), path + "_test")
+                open(path + ".done", "w").close()
+            
+            yield (load_matrix(path + "_train"), load_matrix(path + "_test"), 
+                   y[train_index], y[test_index])
 
-def cv_mse_stats(name, model, X, y):
+def _fold_mse(model, X_train, X_test, y_train, y_test):
+    """
+    Fits a model on one fold and returns the test MSE
+    """
+    model.fit(X_train, y_train)
+    return mean_squared_error(y_test, model.predict(X_test))
+
+def cached_search(model, param_grid, X, y, transform_cache, n_iter = None, n_jobs = -1):
+    """
+    Grid (or randomized if n_iter is given) search over the cached folds of
+    a fold_transform_cache. The transformer is fitted once per fold, so the
+    search time only grows with the model fits.
+    
+    Parameters:
+    ===========
+    model: Sklearn algorithm
+    param_grid: dict or list of dicts (same format as GridSearchCV)
+    X: Dataframe of raw features
+    y: Dataframe or Array of target values
+    transform_cache: fold_transform_cache
+    n_iter: int number of sampled candidates (all candidates if None)
+    n_jobs: int
+    
+    Returns:
+    ========
+    search: search_results (usable with display_search_results)
+    """
+    if n_iter is None:
+        candidates = list(ParameterGrid(param_grid))
+    else:
+        candidates = list(ParameterSampler(param_grid, n_iter, random_state = 42))
+    
+    folds = list(transform_cache.folds(X, y))
+    fold_mse = Parallel(n_jobs = n_jobs)(
+        delayed(_fold_mse)(clone(model).set_params(**params), *fold)
+        for params in candidates for fold in folds)
+    
+    fold_scores = -1*np.array(fold_mse).reshape(len(candidates), len(folds))
+    return search_results(candidates, fold_scores)
+
+def cv_mse_stats(name, model, X, y, transform_cache = None, n_jobs = -1):
     """
     Calculates mean MSE, std of MSE
     
@@ -65,23 +303,158 @@ def cv_mse_stats(name, model, X, y):
     ===========
     name: String name of the trial
     model: Sklearn algorithm 
-    X: Dataframe or Array of features
+    X: Dataframe, Array or sparse matrix of features
+       (raw features if transform_cache is given)
     y: Dataframe or Array of target values
+    transform_cache: fold_transform_cache
+        reuses the cached transformed folds instead of pre-transformed X
+    n_jobs: int number of folds fitted in parallel
     
     Returns:
     ========
     mse: array[name, mean(MSE), std(MSE)]
     """
+    if transform_cache is not None:
+        lin_mse = Parallel(n_jobs = n_jobs)(delayed(_fold_mse)(clone(model), *fold) 
+                                        for fold in transform_cache.folds(X, y))
+        return [name, mean(lin_mse), stdev(lin_mse)]
+    
     lin_neg_mse = cross_val_score(model,
                                   X, 
                                   y, 
                                   scoring = "neg_mean_squared_error", 
                                   cv = 5,
                                   verbose = 0,
-                                  n_jobs = -1)
+                                  n_jobs = n_jobs)
     
     lin_mse = -1*lin_neg_mse
     
     mse = [name, mean(lin_mse), stdev(lin_mse)]
     return mse
-    
\ No newline at end of file
+
+# glibc, hands freed heap memory back to the system (malloc_trim)
+try:
+    _libc = ctypes.CDLL("libc.so.6")
+except OSError:
+    _libc = None
+
+def _rss_mb(field):
+    # VmRSS (current) or VmHWM (peak) of the process in MB
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+
+def reset_peak_rss():
+    """
+    Starts a new peak of the resident memory (RSS) of the process, so the
+    peak of one step can be read in a worker that ran other steps before
+    (Linux only, through /proc/self/clear_refs). The earlier peak of the
+    process (VmHWM, ru_maxrss) is lost.
+    
+    Returns:
+    ========
+    baseline: float resident memory in MB at the reset (NaN if the peak 
+        cannot be reset)
+    """
+    # memory freed by earlier steps but kept by the allocator would hide 
+    # the growth of this step, it is handed back to the system first
+    gc.collect()
+    if _libc is not None:
+        _libc.malloc_trim(0)
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return _rss_mb("VmRSS")
+    except OSError:
+        return np.nan
+
+def peak_rss_mb(baseline):
+    """
+    Parameters:
+    ===========
+    baseline: float returned by reset_peak_rss
+    
+    Returns:
+    ========
+    peak: float peak resident memory in MB since reset_peak_rss, above 
+        the baseline (NaN if unavailable)
+    """
+    if np.isnan(baseline):
+        return np.nan
+    return _rss_mb("VmHWM") - baseline
+
+def _page_in(X):
+    # reads the memory-mapped matrix once, so its shared pages are resident 
+    # before the peak of the fold is reset
+    parts = [X.data, X.indices, X.indptr] if sparse.issparse(X) else [X]
+    for part in parts:
+        np.asarray(part).sum()
+
+def _shared_fold(model, X_path, y_path, fold, train_index, test_index):
+    """
+    Attaches to the memory-mapped data, then fits and scores one fold. 
+    The peak resident memory is reset before the fold and read after it 
+    (outside the timed steps), so it belongs to this fold only, whichever 
+    worker runs it.
+    """
+    X = load_matrix(X_path)
+    y = np.load(y_path, mmap_mode = "r")
+    _page_in(X)
+    baseline = reset_peak_rss()
+    
+    start = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    mse = mean_squared_error(y[test_index], model.predict(X[test_index]))
+    score_time = time.perf_counter() - start
+    peak_memory = peak_rss_mb(baseline)
+    
+    return {"fold": fold, 
+            "fit_time": fit_time, 
+            "score_time": score_time, 
+            "mse": mse, 
+            "peak_memory_mb": peak_memory}
+
+def shared_cv_mse_stats(name, model, X, y, cv = 5, n_jobs = -1, temp_folder = None):
+    """
+    Calculates mean MSE, std of MSE like cv_mse_stats, but X and y are 
+    written once to memory-mapped files that every fold worker attaches to
+    instead of receiving a pickled copy
+    
+    Parameters:
+    ===========
+    name: String name of the trial
+    model: Sklearn algorithm 
+    X: Array or sparse matrix of features
+    y: Dataframe or Array of target values
+    cv: int or sklearn splitter (cv = 5 gives the cv_mse_stats folds)
+    n_jobs: int
+    temp_folder: String folder of the memory-mapped files (system temp if None)
+    
+    Returns:
+    ========
+    mse: array[name, mean(MSE), std(MSE)]
+    timings: DataFrame[fold, fit_time, score_time, mse, peak_memory_mb]
+        peak_memory_mb is the peak resident memory of the fold above the
+        shared data, native allocations included (NaN outside Linux)
+    """
+    folder = tempfile.mkdtemp(prefix = "cv_shared_", dir = temp_folder)
+    try:
+        X_path = os.path.join(folder, "X")
+        y_path = os.path.join(folder, "y.npy")
+        save_matrix(X, X_path)
+        np.save(y_path, np.asarray(y, dtype = np.float64).ravel())
+        
+        splits = check_cv(cv).split(np.zeros(X.shape[0]))
+        timings = Parallel(n_jobs = n_jobs)(
+            delayed(_shared_fold)(clone(model), X_path, y_path, fold, train_index, test_index)
+            for fold, (train_index, test_index) in enumerate(splits))
+    finally:
+        shutil.rmtree(folder, ignore_errors = True)
+    
+    timings = pd.DataFrame(timings)
+    mse = [name, mean(timings["mse"]), stdev(timings["mse"])]
+    return mse, timings
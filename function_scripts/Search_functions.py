@@ -0,0 +1,211 @@
+###### libraries ################################################
+import numpy as np
+import warnings
+from math import ceil, log
+from sklearn.base import clone
+from sklearn.model_selection import cross_val_score, check_cv, ParameterGrid, ParameterSampler
+from sklearn.metrics import mean_squared_error
+from sklearn.exceptions import FitFailedWarning
+from results import search_results
+
+"""
+Budget-aware hyperparameter searches for the tree models. The results use
+the cv_results_ layout of GridSearchCV so they work with
+results.display_search_results.
+"""
+
+###### Functions #################################################
+def _take_rows(X, index):
+    """
+    Selects rows of a dataframe, array or sparse matrix
+    """
+    if hasattr(X, "iloc"):
+        return X.iloc[index]
+    return X[index]
+
+def successive_halving_search(model, param_grid, X, y, n_candidates = None, cv = 3, factor = 3,
+                              min_rows = 1000, scale_estimators = True, n_jobs = -1, random_state = 42):
+    """
+    Successive halving search: every candidate is evaluated on a small row
+    subsample (and a proportionally small n_estimators), the best 1/factor
+    candidates move on to factor times more rows, and the last round uses
+    all rows and the full n_estimators.
+
+    Parameters:
+    ===========
+    model: Sklearn algorithm (Ex: RandomForestRegressor, XGBRegressor)
+    param_grid: dict or list of dicts (same format as GridSearchCV)
+    X: Dataframe, Array or sparse matrix of features
+    y: Dataframe or Array of target values
+    n_candidates: int number of sampled candidates (all grid candidates if None)
+    cv: int number of folds
+    factor: int fraction of candidates kept and growth of the rows per round
+    min_rows: int minimum number of rows of the first round
+    scale_estimators: Boolean scales n_estimators with the fraction of rows
+    n_jobs: int number of folds fitted in parallel
+    random_state: int seed of the candidate sampling and row subsamples
+
+    Returns:
+    ========
+    search: search_results (usable with display_search_results)
+        cv_results_ also holds "iter" (last round of each candidate) and
+        "n_resources" (rows of that round). The best candidate is chosen
+        among the candidates of the last round, and rank_test_score ranks
+        the candidates of later rounds before those of earlier rounds.
+        Candidates whose fit fails (Ex: an invalid sampled max_depth = 0)
+        get NaN scores like in RandomizedSearchCV, rank last and are never
+        kept for the next round.
+    """
+    if n_candidates is None:
+        candidates = list(ParameterGrid(param_grid))
+    else:
+        candidates = list(ParameterSampler(param_grid, n_candidates, random_state = random_state))
+
+    # rows of every round, the last round uses all rows
+    n_rows = X.shape[0]
+    n_rounds = ceil(log(len(candidates)) / log(factor)) + 1 if len(candidates) > 1 else 1
+    rows_per_round = [max(min(n_rows, min_rows), int(n_rows / factor ** (n_rounds - 1 - i)))
+                      for i in range(n_rounds)]
+
+    order = np.random.RandomState(random_state).permutation(n_rows)
+    y = np.asarray(y)
+    default_estimators = model.get_params().get("n_estimators")
+
+    fold_scores = np.zeros((len(candidates), cv))
+    last_round = np.zeros(len(candidates), dtype = int)
+    survivors = list(range(len(candidates)))
+
+    for i, rows in enumerate(rows_per_round):
+        subsample = np.sort(order[:rows])
+        X_round, y_round = _take_rows(X, subsample), y[subsample]
+
+        for c in survivors:
+            params = dict(candidates[c])
+            n_estimators = params.get("n_estimators", default_estimators)
+            if scale_estimators and n_estimators and i < n_rounds - 1:
+                params["n_estimators"] = max(1, int(round(n_estimators * rows / n_rows)))
+
+            try:
+                fold_scores[c] = cross_val_score(clone(model).set_params(**params),
+                                                 X_round,
+                                                 y_round,
+                                                 scoring = "neg_mean_squared_error",
+                                                 cv = cv,
+                                                 n_jobs = n_jobs,
+                                                 error_score = np.nan)
+            except ValueError as error:
+                # cross_val_score raises when every fold failed
+                warnings.warn("Candidate {} failed: {}".format(params, error), FitFailedWarning)
+                fold_scores[c] = np.nan
+            last_round[c] = i
+
+        # keep the best 1/factor candidates for the next round (failed fits are dropped)
+        if i < n_rounds - 1:
+            n_keep = max(1, ceil(len(survivors) / factor))
+            scored = [c for c in survivors if np.isfinite(fold_scores[c]).all()]
+            ranked = sorted(scored, key = lambda c: fold_scores[c].mean(), reverse = True)
+            survivors = ranked[:n_keep]
+            if not survivors:
+                break
+
+    search = search_results(candidates,
+                            fold_scores,
+                            extra = {"iter": last_round,
+                                     "n_resources": np.array(rows_per_round)[last_round]})
+
+    # only candidates of the last round were scored on all rows
+    mean_scores = fold_scores.mean(axis = 1)
+    final = [c for c in range(len(candidates)) 
+             if last_round[c] == n_rounds - 1 and np.isfinite(mean_scores[c])]
+    if not final:
+        raise ValueError("Every candidate failed before the last round, see the FitFailedWarning messages.")
+    best = max(final, key = lambda c: mean_scores[c])
+    search.best_index_ = best
+    search.best_params_ = candidates[best]
+    search.best_score_ = mean_scores[best]
+    
+    # failed candidates last, then by round: earlier rounds were scored on 
+    # fewer rows (and trees)
+    failed = ~np.isfinite(mean_scores)
+    order = np.lexsort((-np.nan_to_num(mean_scores, nan = -np.inf), -last_round, failed))
+    search.cv_results_["rank_test_score"][order] = np.arange(1, len(candidates) + 1)
+    return search
+
+def _staged_fold_mse(model, n_estimators, X_train, X_test, y_train, y_test):
+    """
+    Test MSE of every ensemble size from a single growing ensemble
+
+    Returns:
+    ========
+    mse: list of MSE in the order of sorted n_estimators
+    """
+    sizes = sorted(n_estimators)
+    params = model.get_params()
+
+    # RandomForest/ExtraTrees/GradientBoosting: add trees to the fitted ensemble
+    if "warm_start" in params:
+        model.set_params(warm_start = True)
+        mse = []
+        for n in sizes:
+            model.set_params(n_estimators = n)
+            model.fit(X_train, y_train)
+            mse.append(mean_squared_error(y_test, model.predict(X_test)))
+        return mse
+
+    model.set_params(n_estimators = sizes[-1])
+    model.fit(X_train, y_train)
+
+    # XGBoost: predictions of the first n boosting rounds
+    if hasattr(model, "get_booster"):
+        return [mean_squared_error(y_test, model.predict(X_test, iteration_range = (0, n)))
+                for n in sizes]
+
+    # other boosting models: staged predictions
+    if hasattr(model, "staged_predict"):
+        staged = {}
+        for n, predictions in enumerate(model.staged_predict(X_test), start = 1):
+            if n in sizes:
+                staged[n] = mean_squared_error(y_test, predictions)
+        return [staged[n] for n in sizes]
+
+    raise ValueError("{} cannot grow its ensemble incrementally.".format(type(model).__name__))
+
+def n_estimators_sweep(model, n_estimators, X, y, param_grid = None, cv = 3):
+    """
+    Scores several n_estimators values with one fit per fold and candidate.
+    RandomForest grows a single forest with warm_start, XGBoost is trained
+    once with the largest n_estimators and scored on its first n rounds.
+
+    Parameters:
+    ===========
+    model: Sklearn algorithm (Ex: RandomForestRegressor, XGBRegressor)
+    n_estimators: list of ensemble sizes (Ex: [110, 120, 130])
+    X: Dataframe, Array or sparse matrix of features
+    y: Dataframe or Array of target values
+    param_grid: dict or list of dicts of the other parameters (Ex: {"max_depth": [30, 35]})
+    cv: int or sklearn splitter (same folds as GridSearchCV)
+
+    Returns:
+    ========
+    search: search_results (usable with display_search_results)
+    """
+    sizes = sorted(n_estimators)
+    candidates = list(ParameterGrid(param_grid or {}))
+    y = np.asarray(y)
+    folds = list(check_cv(cv).split(X, y))
+
+    params, fold_scores = [], []
+    for candidate in candidates:
+        scores = np.zeros((len(sizes), len(folds)))
+        for j, (train_index, test_index) in enumerate(folds):
+            scores[:, j] = _staged_fold_mse(clone(model).set_params(**candidate),
+                                            sizes,
+                                            _take_rows(X, train_index),
+                                            _take_rows(X, test_index),
+                                            y[train_index],
+                                            y[test_index])
+
+        params.extend(dict(candidate, n_estimators = n) for n in sizes)
+        fold_scores.extend(-1*scores)
+
+    return search_results(params, np.array(fold_scores))
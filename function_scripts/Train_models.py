@@ -0,0 +1,345 @@
+# libraries
+import pandas as pd
+import numpy as np
+import os
+import time
+import argparse
+import threading
+import joblib
+from concurrent.futures import ThreadPoolExecutor
+from joblib import effective_n_jobs
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PolynomialFeatures
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.ensemble import RandomForestRegressor
+from data_import_functions import get_data
+from Preprocessing import feature_pipeline, tree_pipeline, matrix_nbytes, cv_mse_stats
+from Gram_functions import ridge_path_search
+from Search_functions import n_estimators_sweep
+from results import display_search_results, save_results, save_model, plot_results
+
+# xgboost is optional, its family is skipped when it is not installed
+try:
+    from xgboost import XGBRegressor
+except ImportError:
+    XGBRegressor = None
+
+"""
+Trains the model families of notebook 04 from one script.
+
+The linear, polynomial and tree feature matrices are built once and shared
+by every family. Families run concurrently in threads, each one waits until
+its CPUs and memory fit in the global budget. The result of every family
+is checkpointed to results/checkpoints as soon as it finishes, so an
+interrupted run only trains the missing families when started again.
+
+Run from the project root (the folder holding "data"):
+    python function_scripts/Train_models.py --n-jobs 4 --memory-mb 8000
+"""
+
+# variable grouping
+CAT_VAR = ["jobType", "major", "industry", "degree"]
+NUM_VAR = ["yearsExperience", "milesFromMetropolis"]
+
+### Classes
+class resource_budget():
+    """
+    CPU and memory budget shared by the training threads
+
+    Parameters
+    ==========
+    n_cpus: int number of CPUs
+    memory_mb: float memory in MB (no limit if None)
+
+    Methods
+    =======
+    clamp: limits a request to the size of the budget
+    acquire: blocks until the CPUs and memory are free
+    release: gives the CPUs and memory back
+    """
+    def __init__(self, n_cpus, memory_mb = None):
+        self.n_cpus = n_cpus
+        self.memory_mb = np.inf if memory_mb is None else memory_mb
+        self.free_cpus = self.n_cpus
+        self.free_memory = self.memory_mb
+        self.condition = threading.Condition()
+
+    def clamp(self, cpus, memory_mb):
+        # a request larger than the budget runs alone instead of waiting forever
+        return min(max(cpus, 1), self.n_cpus), min(memory_mb, self.memory_mb)
+
+    def acquire(self, cpus, memory_mb):
+        with self.condition:
+            self.condition.wait_for(lambda: cpus <= self.free_cpus and memory_mb <= self.free_memory)
+            self.free_cpus = self.free_cpus - cpus
+            self.free_memory = self.free_memory - memory_mb
+
+    def release(self, cpus, memory_mb):
+        with self.condition:
+            self.free_cpus = self.free_cpus + cpus
+            self.free_memory = self.free_memory + memory_mb
+            self.condition.notify_all()
+
+### Functions
+def training_plan():
+    """
+    Model families of notebook 04 with their search spaces
+
+    Returns:
+    ========
+    plan: list of dict
+        name: String name of the trial
+        features: "linear", "polynomial" or "tree"
+        model: Sklearn algorithm
+        search: None, "alpha" (ridge_path_search) or "n_estimators" (n_estimators_sweep)
+        param_grid: searched parameters
+        cpus: int CPUs used by the family
+        memory_factor: float memory needed as a multiple of the feature matrix
+    """
+    plan = [{"name": "linear",
+             "features": "linear",
+             "model": LinearRegression(),
+             "cpus": 1,
+             "memory_factor": 2},
+            {"name": "polynomial linear",
+             "features": "polynomial",
+             "model": LinearRegression(),
+             "cpus": 2,
+             "memory_factor": 3},
+            {"name": "Ridge",
+             "features": "linear",
+             "model": Ridge(random_state = 42),
+             "search": "alpha",
+             "param_grid": {"alpha": [0.3, 1, 3, 5, 10]},
+             "cpus": 1,
+             "memory_factor": 2},
+            {"name": "Polynomial Ridge",
+             "features": "polynomial",
+             "model": Ridge(random_state = 42),
+             "search": "alpha",
+             "param_grid": {"alpha": [0.3, 1, 3, 5, 10]},
+             "cpus": 2,
+             "memory_factor": 3},
+            {"name": "Random Forest",
+             "features": "tree",
+             "model": RandomForestRegressor(random_state = 42),
+             "search": "n_estimators",
+             "param_grid": {"n_estimators": [110, 120, 130],
+                            "max_depth": [30, 35],
+                            "min_samples_split": [30, 35, 40],
+                            "max_features": ["sqrt"]},
+             "cpus": 4,
+             "memory_factor": 8}]
+
+    if XGBRegressor is not None:
+        plan.append({"name": "XGBoost Regressor",
+                     "features": "tree",
+                     "model": XGBRegressor(random_state = 42),
+                     "search": "n_estimators",
+                     "param_grid": {"n_estimators": [20, 30, 40, 50],
+                                    "max_depth": [5, 7, 10]},
+                     "cpus": 4,
+                     "memory_factor": 4})
+    return plan
+
+def build_features(features, kinds):
+    """
+    Fits the feature pipelines once. The polynomial matrix is expanded from
+    the linear matrix instead of transforming the raw data again.
+
+    Parameters:
+    ===========
+    features: dataframe of raw features
+    kinds: set of "linear", "polynomial", "tree"
+
+    Returns:
+    ========
+    matrices: dict {kind: (fitted pipeline, feature matrix)}
+    """
+    matrices = {}
+    if kinds & {"linear", "polynomial"}:
+        linear = feature_pipeline(CAT_VAR, NUM_VAR)
+        matrices["linear"] = (linear, linear.fit_transform(features))
+
+    if "polynomial" in kinds:
+        polynomial = PolynomialFeatures(degree = 2)
+        X = polynomial.fit_transform(matrices["linear"][1])
+        pipeline = Pipeline([("preprocess", linear.steps[0][1]),
+                             ("polynomial", polynomial)])
+        matrices["polynomial"] = (pipeline, X)
+
+    if "tree" in kinds:
+        tree = tree_pipeline(CAT_VAR, NUM_VAR)
+        matrices["tree"] = (tree, tree.fit_transform(features))
+    return matrices
+
+def _checkpoint_path(name):
+    PROJECT_ROOT_DIR = "."
+    return os.path.join(PROJECT_ROOT_DIR, "results", "checkpoints",
+                        name.replace(" ", "_") + ".pkl")
+
+def load_checkpoint(name, key):
+    """
+    Returns:
+    ========
+    checkpoint: dict saved by save_checkpoint, None if missing or made
+        for other data or another search space
+    """
+    try:
+        checkpoint = joblib.load(_checkpoint_path(name))
+    except (OSError, EOFError):
+        return None
+    return checkpoint if checkpoint.get("key") == key else None
+
+def save_checkpoint(name, checkpoint):
+    """
+    Saves the result of a family (written to a temporary file first so an
+    interrupted write never leaves a broken checkpoint)
+    """
+    path = _checkpoint_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    joblib.dump(checkpoint, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def _set_n_jobs(model, n_jobs):
+    # models with their own thread pool (RandomForest, XGBoost)
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs = n_jobs)
+    return model
+
+def train_family(spec, X, y, n_jobs = 1):
+    """
+    Searches the parameters of one family and scores the best model with
+    cv_mse_stats
+
+    Parameters:
+    ===========
+    spec: dict from training_plan
+    X: array or sparse matrix of features
+    y: Dataframe or Array of target values
+    n_jobs: int CPUs of the family
+
+    Returns:
+    ========
+    checkpoint: dict
+        mse: array[name, mean(MSE), std(MSE)]
+        params: best parameters
+        search: DataFrame of the searched parameters (None without search)
+        seconds: float training time
+    """
+    start = time.time()
+    search, params = None, {}
+
+    if spec.get("search") == "alpha":
+        result = ridge_path_search(X, y, spec["param_grid"]["alpha"], cv = 5)
+        search, params = display_search_results(result), result.best_params_
+
+    elif spec.get("search") == "n_estimators":
+        grid = dict(spec["param_grid"])
+        n_estimators = grid.pop("n_estimators")
+        result = n_estimators_sweep(_set_n_jobs(clone(spec["model"]), n_jobs), n_estimators, X, y, grid, cv = 3)
+        search, params = display_search_results(result), result.best_params_
+
+    # folds run in parallel, so the model itself uses one thread
+    model = _set_n_jobs(clone(spec["model"]).set_params(**params), 1)
+    mse = cv_mse_stats(spec["name"], model, X, y, n_jobs = n_jobs)
+
+    return {"mse": mse,
+            "params": params,
+            "search": search,
+            "seconds": time.time() - start}
+
+def run_training(features, target, n_jobs = -1, memory_mb = None, families = None,
+                 restart = False, save_best = True):
+    """
+    Trains the families of training_plan concurrently within a CPU/memory
+    budget, resuming from the checkpoints of previous runs
+
+    Parameters:
+    ===========
+    features: dataframe of raw features
+    target: Dataframe or Array of target values
+    n_jobs: int CPUs of the whole run
+    memory_mb: float memory of the whole run in MB (no limit if None)
+    families: list(String) names of the families to train (all if None)
+    restart: Boolean ignores the checkpoints
+    save_best: Boolean refits the best family on all rows and saves it as
+        best_model.pkl with its pipeline.pkl
+
+    Returns:
+    ========
+    results_sorted: DataFrame[Name, Mean MSE, Std MSE] sorted by Mean MSE
+    """
+    plan = [spec for spec in training_plan() if families is None or spec["name"] in families]
+    matrices = build_features(features, {spec["features"] for spec in plan})
+    target = np.asarray(target)
+    data_key = joblib.hash((features, target))
+
+    budget = resource_budget(effective_n_jobs(n_jobs), memory_mb)
+    lock = threading.Lock()
+    checkpoints = {}
+
+    def run(spec):
+        X = matrices[spec["features"]][1]
+        key = joblib.hash((data_key, spec["model"].get_params(), spec.get("param_grid")))
+
+        checkpoint = None if restart else load_checkpoint(spec["name"], key)
+        if checkpoint is None:
+            cpus, memory = budget.clamp(spec["cpus"],
+                                        spec["memory_factor"] * matrix_nbytes(X) / 1024**2)
+            budget.acquire(cpus, memory)
+            try:
+                checkpoint = train_family(spec, X, target, n_jobs = cpus)
+            finally:
+                budget.release(cpus, memory)
+
+            checkpoint["key"] = key
+            save_checkpoint(spec["name"], checkpoint)
+            message = "{} trained in {:.1f}s".format(spec["name"], checkpoint["seconds"])
+        else:
+            message = "{} loaded from checkpoint".format(spec["name"])
+
+        with lock:
+            checkpoints[spec["name"]] = checkpoint
+            print(message)
+
+    with ThreadPoolExecutor(max_workers = len(plan)) as executor:
+        # result() raises the error of a failed family, the others keep their checkpoints
+        for future in [executor.submit(run, spec) for spec in plan]:
+            future.result()
+
+    # organize results storage
+    results_df = pd.DataFrame(data = [checkpoints[spec["name"]]["mse"] for spec in plan],
+                              columns = ["Name", "Mean MSE", "Std MSE"])
+    results_sorted = results_df.sort_values(by = "Mean MSE", ignore_index = True)
+    plot_results(results_sorted, "Model Results")
+    save_results(results_sorted, "Model_MSE_results")
+
+    if save_best:
+        best = next(spec for spec in plan if spec["name"] == results_sorted["Name"][0])
+        pipeline, X = matrices[best["features"]]
+        best_model = clone(best["model"]).set_params(**checkpoints[best["name"]]["params"])
+        best_model.fit(X, target)
+        save_model(best_model, "best_model")
+        save_model(pipeline, "pipeline")
+
+    return results_sorted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Salary prediction model training")
+    parser.add_argument("--n-jobs", type = int, default = -1)
+    parser.add_argument("--memory-mb", type = float, default = None)
+    parser.add_argument("--families", nargs = "+", default = None)
+    parser.add_argument("--restart", action = "store_true")
+    parser.add_argument("--no-save-best", action = "store_true")
+    args = parser.parse_args()
+
+    # load in the data
+    data = get_data("train", key = "jobId", target_variable = "salary", remove_zeros = True)
+    features = data.drop(["jobId", "companyId", "salary"], axis = 1)
+    target = data["salary"]
+
+    results_sorted = run_training(features, target, args.n_jobs, args.memory_mb, args.families,
+                                  args.restart, not args.no_save_best)
+    print(results_sorted)
@@ -1,12 +1,201 @@
 # Libraries
 import pandas as pd
+import numpy as np
+import os
+import json
+import hashlib
 
 """
 Here are the helper functions for data import
 """
 
+# compact column types for get_data(..., schema = DATA_SCHEMA)
+# "category": pandas categorical, "downcast": smallest integer type that 
+# holds the values (cast to int64 before multiplying two downcast columns)
+DATA_SCHEMA = {"companyId": "category",
+               "jobType": "category",
+               "degree": "category",
+               "major": "category",
+               "industry": "category",
+               "yearsExperience": "downcast",
+               "milesFromMetropolis": "downcast",
+               "salary": "downcast"}
+
+# version of the cache layout, caches of another version are rebuilt
+CACHE_FORMAT = 2
+
 # functions
-def read_data(dset, return_data = False, verbose = False):
+def _cache_folder(path, cache_dir):
+    """
+    Folder holding the columnar cache of a csv file
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, name)
+
+def _source_signature(path):
+    """
+    Size and modification time of the source csv
+    """
+    stats = os.stat(path)
+    return {"source_size": stats.st_size, "source_mtime_ns": stats.st_mtime_ns}
+
+def write_cache(data, path, cache_dir = "data/cache"):
+    """
+    Stores a dataframe read from a csv as one .npy file per column. 
+    Low-cardinality object and category columns are dictionary-encoded as 
+    integer codes + levels, unique-like text columns (Ex: jobId) are 
+    stored as plain strings.
+    
+    Parameters
+    ----------
+    data: dataframe
+        parsed content of the csv
+        
+    path: String
+        path of the source csv
+        
+    cache_dir: String
+        folder of the cache
+    """
+    folder = _cache_folder(path, cache_dir)
+    os.makedirs(folder, exist_ok = True)
+    
+    columns = []
+    for i, col in enumerate(data.columns):
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            codes, levels = data[col].cat.codes.to_numpy(), data[col].cat.categories
+        elif data[col].dtype == "O":
+            codes, levels = pd.factorize(data[col])
+        
+        if data[col].dtype == "O" and 2 * len(levels) > len(data):
+            # a key column gains nothing from a dictionary ("" marks missing 
+            # values, pd.read_csv never returns empty strings)
+            np.save(os.path.join(folder, "{}.npy".format(i)), data[col].fillna("").to_numpy(dtype = str))
+            columns.append({"name": col, "kind": "strings"})
+        elif data[col].dtype == "O" or isinstance(data[col].dtype, pd.CategoricalDtype):
+            # dictionary encoding (-1 marks missing values)
+            codes = codes.astype(np.min_scalar_type(-len(levels) - 1))
+            np.save(os.path.join(folder, "{}.codes.npy".format(i)), codes)
+            np.save(os.path.join(folder, "{}.levels.npy".format(i)), np.asarray(levels).astype(str))
+            columns.append({"name": col, "kind": "codes"})
+        else:
+            np.save(os.path.join(folder, "{}.npy".format(i)), data[col].to_numpy())
+            columns.append({"name": col, "kind": "numeric"})
+    
+    # the metadata is written last so a partial cache is never used
+    meta = dict(_source_signature(path), format = CACHE_FORMAT, columns = columns)
+    meta_path = os.path.join(folder, "meta.json")
+    with open(meta_path + ".tmp", "w") as file:
+        json.dump(meta, file)
+    os.replace(meta_path + ".tmp", meta_path)
+    
+def _decode(codes, levels, col_type):
+    """
+    Column of a dictionary-encoded cache entry, typed like pd.read_csv
+    """
+    if col_type == "category":
+        # pd.read_csv sorts the categories, the codes are mapped to that order
+        categories = np.sort(levels)
+        mapping = np.append(np.searchsorted(categories, levels), -1)
+        return pd.Categorical.from_codes(mapping[codes], categories)
+    
+    # the rows share the level strings, -1 picks the trailing NaN
+    return np.append(levels.astype(object), np.nan)[codes]
+    
+def read_cache(path, cache_dir = "data/cache", dtype = None):
+    """
+    Loads the cached columns of a csv if the csv is unchanged
+    
+    Parameters
+    ----------
+    path: String
+        path of the source csv
+        
+    cache_dir: String
+        folder of the cache
+        
+    dtype: dict
+        {column: type} as passed to pd.read_csv (Ex: "category")
+    
+    Returns
+    -------
+    data: DataFrame or None
+        None if there is no cache or the csv size/mtime changed. Otherwise
+        the same columns and dtypes as pd.read_csv(path, dtype = dtype):
+        text columns are objects unless dtype asks for "category".
+    """
+    folder = _cache_folder(path, cache_dir)
+    try:
+        with open(os.path.join(folder, "meta.json")) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    
+    signature = _source_signature(path)
+    if meta.get("format") != CACHE_FORMAT or any(meta.get(key) != value for key, value in signature.items()):
+        return None
+    
+    dtype = {} if dtype is None else dtype
+    data, converted = {}, []
+    for i, column in enumerate(meta["columns"]):
+        name = column["name"]
+        if column["kind"] == "codes":
+            codes = np.load(os.path.join(folder, "{}.codes.npy".format(i)), mmap_mode = "r")
+            levels = np.load(os.path.join(folder, "{}.levels.npy".format(i)))
+            data[name] = _decode(codes, levels, dtype.get(name))
+            if dtype.get(name) == "category":
+                converted.append(name)
+        elif column["kind"] == "strings":
+            values = np.load(os.path.join(folder, "{}.npy".format(i))).astype(object)
+            values[values == ""] = np.nan
+            data[name] = values
+        else:
+            data[name] = np.load(os.path.join(folder, "{}.npy".format(i)), mmap_mode = "r")
+    data = pd.DataFrame(data)
+    
+    # the remaining requested types are applied as pd.read_csv would
+    remaining = {col: col_type for col, col_type in dtype.items() if col in data.columns and col not in converted}
+    return data.astype(remaining) if remaining else data
+
+def read_csv_cached(path, cache = True, cache_dir = "data/cache", dtype = None):
+    """
+    Reads a csv through the columnar cache
+    
+    Parameters
+    ----------
+    path: String
+        path of the csv
+        
+    cache: Boolean
+        reuse/write the columnar cache
+        
+    cache_dir: String
+        folder of the cache
+        
+    dtype: dict
+        {column: type} passed to pd.read_csv when the csv is parsed, so
+        category columns are never held as strings. A cache hit returns
+        the same dtypes.
+    
+    Returns
+    -------
+    data: DataFrame
+    """
+    if cache:
+        data = read_cache(path, cache_dir, dtype)
+        if data is not None:
+            return data
+    
+    data = pd.read_csv(path, dtype = dtype)
+    
+    if cache:
+        try:
+            write_cache(data, path, cache_dir)
+        except OSError:
+            print("Unable to write the cache of {}.".format(path))
+    return data
+
+def read_data(dset, return_data = False, verbose = False, cache = True, dtype = None):
     """
     Parameters
     ----------
@@ -19,6 +208,11 @@ def read_data(dset, return_data = False, verbose = False):
     verbose: Boolean
         Denotes if basic dataset characteristics are needed
         
+    cache: Boolean
+        Reuses the columnar cache in data/cache when the csv is unchanged
+        
+    dtype: dict
+        {column: type} used when parsing the csv files (Ex: "category")
 
     Returns
     -------
@@ -30,9 +224,9 @@ def read_data(dset, return_data = False, verbose = False):
     """   
     
     # get data
-    features = pd.read_csv("data/{}_features.csv".format(dset))
+    features = read_csv_cached("data/{}_features.csv".format(dset), cache, dtype = dtype)
     if dset == "train":
-        target_variable = pd.read_csv("data/{}_salaries.csv".format(dset))
+        target_variable = read_csv_cached("data/{}_salaries.csv".format(dset), cache, dtype = dtype)
     
     # basic dataframe characteristics
     if verbose:
@@ -149,7 +343,138 @@ def clean_detail_report(data, target_variable):
     print("\nDuplicates:")
     duplicates(data)
    
-def get_data(dset, key = None, target_variable = None, clean_details = False, remove_zeros = False):
+def categorical_columns(data):
+    """
+    Parameters
+    ----------
+    data: dataframe
+    
+    Returns
+    -------
+    columns: Index of object and pandas category columns
+    """
+    return data.columns[[t == "O" or isinstance(t, pd.CategoricalDtype) for t in data.dtypes]]
+
+def integer_columns(data):
+    """
+    Parameters
+    ----------
+    data: dataframe
+    
+    Returns
+    -------
+    columns: Index of integer columns of any width (int64 or downcast)
+    """
+    return data.columns[[pd.api.types.is_integer_dtype(t) for t in data.dtypes]]
+
+def downcast_integers(series):
+    """
+    Parameters
+    ----------
+    series: pandas series of integers
+    
+    Returns
+    -------
+    series: pandas series
+        smallest integer type whose range covers the values, unsigned if
+        no value is negative. Arithmetic stays in that type, so cast to 
+        int64 before multiplying columns (uint8 24*99 wraps to 72).
+    """
+    series = pd.to_numeric(series)
+    if not pd.api.types.is_integer_dtype(series) or len(series) == 0:
+        return series
+    
+    lower, upper = int(series.min()), int(series.max())
+    if lower >= 0:
+        dtypes = [np.uint8, np.uint16, np.uint32, np.uint64]
+    else:
+        dtypes = [np.int8, np.int16, np.int32, np.int64]
+    for dtype in dtypes:
+        if np.iinfo(dtype).min <= lower and upper <= np.iinfo(dtype).max:
+            return series.astype(dtype)
+    return series
+
+def apply_schema(data, schema):
+    """
+    Converts columns to the types of a schema
+    
+    Parameters
+    ----------
+    data: dataframe
+    
+    schema: dict
+        {column: type}, type is "category", "downcast" or any pandas dtype.
+        Columns missing from the data are ignored.
+    
+    Returns
+    -------
+    data: DataFrame 
+        converted copy of the data
+    """
+    data = data.copy()
+    for col, col_type in schema.items():
+        if col not in data.columns:
+            continue
+        if col_type == "downcast":
+            data[col] = downcast_integers(data[col])
+        else:
+            data[col] = data[col].astype(col_type)
+    return data
+
+def _plain_types(data):
+    # the frame with the object columns a plain pd.read_csv would return
+    return data.astype({col: object for col in data.columns if isinstance(data[col].dtype, pd.CategoricalDtype)})
+
+def memory_report(before, after):
+    """
+    Prints the memory footprint of a dataframe before and after a conversion
+    
+    Parameters
+    ----------
+    before: dataframe
+    after: dataframe
+    
+    Returns
+    -------
+    report: DataFrame 
+        dtypes and MB per column
+    """
+    report = pd.DataFrame({"dtype before": before.dtypes.astype(str),
+                           "MB before": before.memory_usage(index = False, deep = True) / 1e6,
+                           "dtype after": after.dtypes.astype(str),
+                           "MB after": after.memory_usage(index = False, deep = True) / 1e6})
+    report.loc["total"] = ["", report["MB before"].sum(), "", report["MB after"].sum()]
+    
+    print('\n{0:*^80}\n'.format(' Memory Report '))
+    print(report.round(2))
+    print("\nFootprint reduced by {:.1f}x".format(report.loc["total", "MB before"] / report.loc["total", "MB after"]))
+    return report
+
+def column_fingerprints(data, columns = None):
+    """
+    Fast content hashes of the columns of a dataframe, used to detect that
+    the data behind a saved figure has not changed
+    
+    Parameters
+    ----------
+    data: dataframe
+    columns: list of columns (all columns if None)
+    
+    Returns
+    -------
+    fingerprints: dict {column: hex digest}
+        the digest depends on the values and their order, not on the dtype
+        (an object column and its category version match)
+    """
+    columns = data.columns if columns is None else columns
+    fingerprints = {}
+    for col in columns:
+        hashes = pd.util.hash_pandas_object(data[col], index = False).to_numpy()
+        fingerprints[col] = hashlib.sha1(hashes.tobytes()).hexdigest()
+    return fingerprints
+
+def get_data(dset, key = None, target_variable = None, clean_details = False, remove_zeros = False, cache = True, 
+             schema = None, report_memory = False):
     """
     Parameters
     ----------
@@ -159,6 +484,13 @@ def get_data(dset, key = None, target_variable = None, clean_details = False, re
         Common column that joins the features and target datasets
     target_variable: String
         Name of the target Variable
+    cache: Boolean
+        Reuses the columnar cache in data/cache when the csv files are unchanged
+    schema: dict
+        Column types (Ex: DATA_SCHEMA). Category columns are parsed as
+        categoricals, integer columns are downcast after loading.
+    report_memory: Boolean
+        Prints the footprint of the plain csv types and of the schema types
 
     Returns
     -------
@@ -172,16 +504,35 @@ def get_data(dset, key = None, target_variable = None, clean_details = False, re
     if dset not in dataset_name:
         raise ValueError("Please specify which dataset if needed: {'train', 'test'}")
     
+    # category columns are typed while parsing, not after a full string load
+    dtype = None
+    if schema is not None:
+        dtype = {col: col_type for col, col_type in schema.items() if col_type != "downcast"}
+    
     if dset == "train":
         # get train data
-        features, target = read_data(dset, return_data = True)
+        features, target = read_data(dset, return_data = True, cache = cache, dtype = dtype)
 
         # join data
         merged_data = merge_data(features, target, common_id)
+        
+        # compact column types
+        if schema is not None:
+            typed_data = apply_schema(merged_data, schema)
+            if report_memory:
+                memory_report(_plain_types(merged_data), typed_data)
+            merged_data = typed_data
     
     if dset == "test":
         # get train data
-        test_features = read_data(dset, return_data = True)
+        test_features = read_data(dset, return_data = True, cache = cache, dtype = dtype)
+        
+        # compact column types
+        if schema is not None:
+            typed_features = apply_schema(test_features, schema)
+            if report_memory:
+                memory_report(_plain_types(test_features), typed_features)
+            test_features = typed_features
         return test_features
         
     # clean data info
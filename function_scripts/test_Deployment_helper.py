@@ -0,0 +1,84 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from sklearn.linear_model import LinearRegression
+from Benchmark_functions import make_job_listings, benchmark_scoring
+from Preprocessing import feature_pipeline
+import Deployment_helper as dh
+
+"""
+Tests of the scoring entry points
+"""
+
+CAT_VAR = ["jobType", "degree", "major", "industry"]
+NUM_VAR = ["yearsExperience", "milesFromMetropolis"]
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    # a project folder with a fitted pipeline and model
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("model")
+    os.makedirs("results")
+    listings = make_job_listings(2000, target = True)
+    pipeline = feature_pipeline(CAT_VAR, NUM_VAR, degree = 2)
+    features = pipeline.fit_transform(listings.drop(["jobId", "companyId", "salary"], axis = 1))
+    joblib.dump(pipeline, "model/pipeline.pkl")
+    joblib.dump(LinearRegression().fit(features, listings["salary"]), "model/best_model.pkl")
+    dh.clear_artifact_cache()
+    yield tmp_path
+    dh.clear_artifact_cache()
+
+def test_score_data_matches_the_saved_pipeline(project):
+    listings = make_job_listings(500, random_state = 1)
+    pipeline, model = joblib.load("model/pipeline.pkl"), joblib.load("model/best_model.pkl")
+    expected = model.predict(pipeline.transform(listings.drop(["jobId", "companyId"], axis = 1)))
+
+    predictions = dh.score_data(listings)
+    assert (predictions["jobId"] == listings["jobId"]).all()
+    np.testing.assert_allclose(predictions["predicted_salary"], expected)
+
+def test_score_data_timings_do_not_change_the_predictions(project):
+    listings = make_job_listings(500, random_state = 1)
+    timings = {}
+    assert_frame_equal(dh.score_data(listings, timings = timings), dh.score_data(listings))
+    assert set(timings) == {"preprocess", "predict", "assemble", "total"}
+    assert timings["total"] == pytest.approx(timings["preprocess"] + timings["predict"] + timings["assemble"])
+
+def test_benchmark_reports_the_score_data_stages(project):
+    report = benchmark_scoring([10, 100], max_repeats = 2)
+    for result in report["results"]:
+        assert set(result["stages"]) == {"preprocess", "predict", "assemble"}
+        assert result["rows_per_second"] > 0
+
+@pytest.mark.parametrize("content", ["", "jobId,companyId,jobType,degree,major,industry,yearsExperience,milesFromMetropolis\n"])
+def test_streaming_empty_input_writes_the_header(project, content):
+    with open("empty.csv", "w") as file:
+        file.write(content)
+    assert dh.streaming_deployment_pipeline("empty.csv", "out.csv") == 0
+    with open("out.csv") as file:
+        assert file.read() == ",jobId,predicted_salary\n"
+
+def test_streaming_matches_score_data(project):
+    listings = make_job_listings(1000, random_state = 3)
+    listings.to_csv("listings.csv", index = False)
+    assert dh.streaming_deployment_pipeline("listings.csv", "out.csv", chunksize = 300) == 1000
+    streamed = pd.read_csv("out.csv", index_col = 0)
+    np.testing.assert_allclose(streamed["predicted_salary"], dh.score_data(listings)["predicted_salary"])
+    assert streamed.index.tolist() == list(range(1000))
+
+def test_parallel_matches_score_data(project):
+    listings = make_job_listings(1000, random_state = 3)
+    predictions = dh.parallel_deployment_pipeline(listings, n_jobs = 2, save = False)
+    assert_frame_equal(predictions, dh.score_data(listings))
+
+@pytest.mark.parametrize("damage", ["missing", "corrupt"])
+def test_parallel_reports_the_bad_artifact(project, damage):
+    os.remove("model/best_model.pkl")
+    if damage == "corrupt":
+        with open("model/best_model.pkl", "wb") as file:
+            file.write(b"not a pickle")
+    with pytest.raises(ValueError, match = "best_model.pkl"):
+        dh.parallel_deployment_pipeline(make_job_listings(10), n_jobs = 2, save = False)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from Benchmark_functions import make_job_listings
+from EDA_helper_functions import build_cube, target_encoded_corr
+
+"""
+Tests of the aggregate cube statistics
+"""
+
+CAT_VAR = ["jobType", "degree", "major", "industry"]
+
+def encoded_corr(data, target_col):
+    # data.corr() after replacing every categorical level by its target average
+    encoded = data.drop(columns = ["jobId", "companyId"])
+    for col in CAT_VAR:
+        encoded[col] = encoded.groupby(col)[target_col].transform("mean")
+    return encoded.corr()
+
+@pytest.mark.parametrize("correlation_only", [True, False])
+@pytest.mark.parametrize("integer_target", [True, False])
+def test_target_encoded_corr_keeps_decimal_columns(correlation_only, integer_target):
+    data = make_job_listings(3000, target = True)
+    data["rating"] = np.random.RandomState(0).rand(3000) + 0.01 * data["yearsExperience"]
+    if integer_target:
+        data["salary"] = data["salary"].round().astype(int)
+    expected = encoded_corr(data, "salary")
+
+    cube = build_cube(data, "salary", chunksize = 1000, correlation_only = correlation_only)
+    corr = target_encoded_corr(cube, "salary", list(expected.columns))
+    np.testing.assert_allclose(corr.to_numpy(), expected.to_numpy(), atol = 1e-10)
+    assert sorted(target_encoded_corr(cube, "salary").columns) == sorted(expected.columns)
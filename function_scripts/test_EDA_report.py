@@ -0,0 +1,73 @@
+import os
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+from Benchmark_functions import make_job_listings
+import EDA_helper_functions as eda
+from EDA_report import report_figures, run_eda_report
+from results import figure_manifest
+
+"""
+Tests of the parallel EDA report and the figure manifest it shares with
+the notebook plot functions
+"""
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(plt, "show", lambda: None)
+    yield tmp_path
+    plt.close("all")
+
+def job_listings():
+    # the salaries of the raw data are whole numbers
+    data = make_job_listings(2000, target = True)
+    data["salary"] = data["salary"].round().astype(int)
+    return data
+
+def draw_notebook_figures(data, monkeypatch):
+    # runs the plot calls of notebook 01, returns the names of the saved figures
+    saved = []
+    save_figure = eda.save_figure
+    def counting_save_figure(fig_name, *args, **kwargs):
+        saved.append(fig_name)
+        save_figure(fig_name, *args, **kwargs)
+        plt.close("all")
+    monkeypatch.setattr(eda, "save_figure", counting_save_figure)
+
+    eda.num_eda(data, "salary", summary = True, max_fliers = 50)
+    eda.target_num_eda(data, "salary", summary = True, max_fliers = 50)
+    eda.cat_eda(data, "salary", summary = True, max_fliers = 50)
+    eda.interaction_plots(data, summary = True, max_fliers = 50)
+    eda.corr_heat_map(data, "salary")
+    return saved
+
+def test_notebook_and_runner_share_figure_keys(project, monkeypatch):
+    data = job_listings()
+    figures = report_figures(data, "salary", summary = True, max_fliers = 50)
+
+    # notebook, then runner, then notebook again: only the first pass draws
+    assert sorted(draw_notebook_figures(data, monkeypatch)) == sorted(figure[0] for figure in figures)
+    manifest = figure_manifest()
+    assert run_eda_report(data, "salary", n_jobs = 1) == []
+    assert draw_notebook_figures(data, monkeypatch) == []
+    assert figure_manifest() == manifest
+
+def test_runner_figures_are_reused_by_the_notebook(project, monkeypatch):
+    data = job_listings()
+    assert len(run_eda_report(data, "salary", n_jobs = 1)) == len(report_figures(data, "salary"))
+    assert draw_notebook_figures(data, monkeypatch) == []
+
+    # a changed column only redraws the figures drawn from it
+    data["milesFromMetropolis"] = data["milesFromMetropolis"][::-1].to_numpy()
+    redrawn = run_eda_report(data, "salary", n_jobs = 1)
+    assert "num_eda_plot_milesFromMetropolis" in redrawn
+    assert "corr_heat_map" in redrawn
+    assert "cat_eda_plot_jobType" not in redrawn
+
+@pytest.mark.parametrize("n_jobs", [0, -2, 1.5])
+def test_invalid_n_jobs_is_rejected(project, n_jobs):
+    with pytest.raises(ValueError, match = "n_jobs"):
+        run_eda_report(job_listings(), "salary", n_jobs = n_jobs)
+    assert not os.path.exists("images")
@@ -0,0 +1,68 @@
+import os
+import json
+import threading
+import urllib.request
+import urllib.error
+import joblib
+import pytest
+from sklearn.linear_model import LinearRegression
+from Benchmark_functions import make_job_listings
+from Preprocessing import feature_pipeline
+import Deployment_helper as dh
+import Prediction_service as ps
+
+"""
+Tests of the status codes of the scoring server
+"""
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # a scoring server over a small fitted pipeline and model
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("model")
+    listings = make_job_listings(2000, target = True)
+    pipeline = feature_pipeline(["jobType", "degree", "major", "industry"], 
+                                ["yearsExperience", "milesFromMetropolis"])
+    features = pipeline.fit_transform(listings.drop(["jobId", "companyId", "salary"], axis = 1))
+    joblib.dump(pipeline, "model/pipeline.pkl")
+    joblib.dump(LinearRegression().fit(features, listings["salary"]), "model/best_model.pkl")
+    dh.clear_artifact_cache()
+    
+    server = ps.make_server(port = 0)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    yield "http://127.0.0.1:{}/predict".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+    dh.clear_artifact_cache()
+
+def post(url, body):
+    request = urllib.request.Request(url, data = body.encode("utf-8"), 
+                                     headers = {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+def listing(**changes):
+    return json.dumps(dict(make_job_listings(1).iloc[0].to_dict(), **changes))
+
+def test_valid_listing_is_scored(server):
+    code, payload = post(server, listing())
+    assert code == 200
+    assert len(payload["predictions"]) == 1
+
+@pytest.mark.parametrize("body", ["{not json", json.dumps([{"degree": "NONE"}]), 
+                                  json.dumps([{"jobId": "1", "jobType": "CEO"}])])
+def test_malformed_payload_is_a_client_error(server, body):
+    assert post(server, body)[0] == 400
+
+def test_rejected_values_are_a_client_error(server):
+    assert post(server, listing(jobType = "ASTRONAUT"))[0] == 400
+
+def test_broken_model_is_a_server_error(server):
+    with open("model/best_model.pkl", "wb") as file:
+        file.write(b"not a pickle")
+    code, payload = post(server, listing())
+    assert code == 500
+    assert "best_model.pkl" in payload["error"]
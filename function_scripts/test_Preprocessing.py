@@ -0,0 +1,72 @@
+import os
+import sys
+import numpy as np
+import pytest
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import KFold
+from Benchmark_functions import make_job_listings
+from Preprocessing import feature_pipeline, fold_transform_cache, shared_cv_mse_stats
+
+"""
+Tests of the fold caches and the shared-memory fold scheduler
+"""
+
+CAT_VAR = ["jobType", "degree", "major", "industry"]
+NUM_VAR = ["yearsExperience", "milesFromMetropolis"]
+
+@pytest.fixture
+def listings():
+    listings = make_job_listings(600, target = True)
+    return listings[CAT_VAR + NUM_VAR], listings["salary"]
+
+def cached_folders(cache_dir):
+    return sorted(os.listdir(cache_dir)) if os.path.exists(cache_dir) else []
+
+def test_unseeded_shuffle_gets_new_folds(tmp_path, listings):
+    X, y = listings
+    cache = fold_transform_cache(feature_pipeline(CAT_VAR, NUM_VAR), KFold(3, shuffle = True), str(tmp_path))
+
+    # the second call splits again and must not reuse the first folds
+    for _ in range(2):
+        for (X_train, X_test, y_train, y_test) in cache.folds(X, y):
+            assert X_train.shape[0] + X_test.shape[0] == len(X)
+    assert len(cached_folders(str(tmp_path))) == 2
+
+def test_cached_folds_match_a_fresh_transform(tmp_path, listings):
+    X, y = listings
+    cv = KFold(3, shuffle = True, random_state = 0)
+    cache = fold_transform_cache(feature_pipeline(CAT_VAR, NUM_VAR), cv, str(tmp_path))
+
+    for _ in range(2):
+        folds = list(cache.folds(X, y))
+        for (train_index, test_index), (X_train, X_test, y_train, y_test) in zip(cv.split(X), folds):
+            pipeline = feature_pipeline(CAT_VAR, NUM_VAR).fit(X.iloc[train_index])
+            np.testing.assert_allclose(X_test.toarray(), pipeline.transform(X.iloc[test_index]).toarray())
+            np.testing.assert_array_equal(y_test, y.to_numpy()[test_index])
+    assert len(cached_folders(str(tmp_path))) == 1
+
+class allocating_model(BaseEstimator, RegressorMixin):
+    # holds a buffer of n_mb MB after fit, like a large fitted model
+    def __init__(self, n_mb = 100):
+        self.n_mb = n_mb
+
+    def fit(self, X, y):
+        self.buffer_ = np.ones(self.n_mb * 1024**2 // 8)
+        self.mean_ = float(np.mean(y))
+        return self
+
+    def predict(self, X):
+        return np.full(X.shape[0], self.mean_)
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason = "resident memory is read from /proc")
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_fold_memory_counts_native_buffers(listings, n_jobs):
+    X, y = listings
+    X = feature_pipeline(CAT_VAR, NUM_VAR).fit_transform(X)
+    timings = shared_cv_mse_stats("allocating", allocating_model(100), X, y, cv = 3, n_jobs = n_jobs)[1]
+    # every fold, also on a reused worker, reports its own buffer
+    assert (timings["peak_memory_mb"] > 90).all()
+
+    timings = shared_cv_mse_stats("linear", LinearRegression(), X, y, cv = 3, n_jobs = n_jobs)[1]
+    assert (timings["peak_memory_mb"] < 50).all()
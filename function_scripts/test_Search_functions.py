@@ -0,0 +1,54 @@
+import warnings
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor
+from Benchmark_functions import make_job_listings
+from Preprocessing import tree_pipeline
+from Search_functions import successive_halving_search
+
+"""
+Tests of the successive halving search
+"""
+
+@pytest.fixture
+def tree_features():
+    listings = make_job_listings(3000, target = True)
+    X = tree_pipeline(["jobType", "degree", "major", "industry"], 
+                      ["yearsExperience", "milesFromMetropolis"]).fit_transform(listings)
+    return X, listings["salary"]
+
+def search(model, param_grid, X, y, **kwargs):
+    with warnings.catch_warnings():
+        # failed fits are reported with FitFailedWarning
+        warnings.simplefilter("ignore")
+        return successive_halving_search(model, param_grid, X, y, min_rows = 300, n_jobs = 1, **kwargs)
+
+def test_failed_candidates_rank_last_and_are_not_kept(tree_features):
+    X, y = tree_features
+    # max_depth = 0 is invalid, like the sampled grid of notebook 04
+    result = search(DecisionTreeRegressor(random_state = 0), {"max_depth": [0, 2, 4, 6, 8, 10, 12, 14, 16]}, X, y)
+    results = result.cv_results_
+    failed = np.isnan(results["mean_test_score"])
+
+    assert failed.tolist() == [params["max_depth"] == 0 for params in results["params"]]
+    assert results["iter"][failed].max() == 0
+    assert (results["rank_test_score"][failed] == failed.size).all()
+    assert result.best_params_["max_depth"] != 0
+    assert results["rank_test_score"][result.best_index_] == 1
+    assert sorted(results["rank_test_score"]) == list(range(1, failed.size + 1))
+
+def test_sampled_notebook_grid_does_not_crash(tree_features):
+    X, y = tree_features
+    param_rf = {"max_depth": [int(x) for x in np.linspace(0, 80, num = 20)],
+                "n_estimators": [int(x) for x in np.linspace(0, 120, num = 20)],
+                "min_samples_split": [int(x) for x in np.linspace(0, 25, num = 20)],
+                "max_features": ["auto", "sqrt"]}
+    result = search(RandomForestRegressor(random_state = 42), param_rf, X, y, n_candidates = 10)
+    assert np.isfinite(result.best_score_)
+    assert result.cv_results_["rank_test_score"][result.best_index_] == 1
+
+def test_every_candidate_failing_raises(tree_features):
+    X, y = tree_features
+    with pytest.raises(ValueError, match = "Every candidate failed"):
+        search(DecisionTreeRegressor(), {"max_depth": [0, -1]}, X, y)
@@ -0,0 +1,61 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from Benchmark_functions import make_job_listings
+import data_import_functions as dif
+
+"""
+Tests of the columnar csv cache
+"""
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    # a project folder with small train/test csv files
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    listings = make_job_listings(500, target = True)
+    listings.loc[3, "major"] = np.nan
+    listings.drop(columns = "salary").to_csv("data/train_features.csv", index = False)
+    listings[["jobId", "salary"]].to_csv("data/train_salaries.csv", index = False)
+    make_job_listings(300, random_state = 1).to_csv("data/test_features.csv", index = False)
+    return tmp_path
+
+@pytest.mark.parametrize("dset", ["train", "test"])
+@pytest.mark.parametrize("schema", [None, dif.DATA_SCHEMA])
+def test_cache_hit_matches_csv_read(project, dset, schema):
+    cold = dif.get_data(dset, key = "jobId", cache = False, schema = schema)
+    dif.get_data(dset, key = "jobId", schema = schema)
+    warm = dif.get_data(dset, key = "jobId", schema = schema)
+    assert_frame_equal(warm, cold)
+
+def test_plain_read_after_schema_read(project):
+    # a cache written from categoricals still returns objects without a schema
+    dif.get_data("train", key = "jobId", schema = dif.DATA_SCHEMA)
+    warm = dif.get_data("train", key = "jobId")
+    assert_frame_equal(warm, dif.get_data("train", key = "jobId", cache = False))
+    assert (warm.drop(columns = "salary").dtypes[:6] == "O").all()
+
+def test_key_column_is_not_dictionary_encoded(project):
+    dif.read_csv_cached("data/train_features.csv")
+    with open("data/cache/train_features/meta.json") as file:
+        kinds = {column["name"]: column["kind"] for column in json.load(file)["columns"]}
+    assert kinds["jobId"] == "strings"
+    assert kinds["major"] == "codes"
+
+def test_changed_csv_is_read_again(project):
+    dif.read_csv_cached("data/test_features.csv")
+    make_job_listings(10, random_state = 2).to_csv("data/test_features.csv", index = False)
+    assert len(dif.read_csv_cached("data/test_features.csv")) == 10
+
+@pytest.mark.parametrize("values, dtype", [([0, 24], np.uint8),
+                                           ([0, 301], np.uint16),
+                                           ([-1, 127], np.int8),
+                                           ([-129, 5], np.int16),
+                                           ([0, 70000], np.uint32)])
+def test_downcast_integers_picks_smallest_type(values, dtype):
+    series = dif.downcast_integers(pd.Series(values))
+    assert series.dtype == dtype
+    assert series.tolist() == values
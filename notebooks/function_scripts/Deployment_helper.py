@@ -1,8 +1,72 @@
 # libraries
 import pandas as pd
+import numpy as np
 import os
+import time
 import joblib
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+### Artifact cache
+# process-level storage of unpickled artifacts: {path: (signature, object)}
+_ARTIFACT_CACHE = {}
+
+def file_signature(path):
+    """
+    Cheap fingerprint of a file on disk used to detect changes
+    
+    Parameters:
+    ===========
+    path: String
+        path to the file
+        
+    Returns:
+    ========
+    signature: tuple(int, int)
+        (modification time in ns, size in bytes)
+    """
+    stats = os.stat(path)
+    return (stats.st_mtime_ns, stats.st_size)
+
+def load_artifact(path):
+    """
+    Loads a pickled artifact through a process-level cache. The file is
+    only unpickled again when its signature on disk changes (hot-reload).
+    
+    Parameters:
+    ===========
+    path: String
+        path to the .pkl file
+        
+    Returns:
+    ========
+    artifact: object stored in the file
+    """
+    key = os.path.abspath(path)
+    signature = file_signature(key)
+    
+    # reuse the object in memory if the file has not changed
+    cached = _ARTIFACT_CACHE.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    artifact = joblib.load(key)
+    _ARTIFACT_CACHE[key] = (signature, artifact)
+    return artifact
+
+def clear_artifact_cache(path = None):
+    """
+    Invalidates cached artifacts
+    
+    Parameters:
+    ===========
+    path: String
+        path of the artifact to drop. All artifacts are dropped if None.
+    """
+    if path is None:
+        _ARTIFACT_CACHE.clear()
+    else:
+        _ARTIFACT_CACHE.pop(os.path.abspath(path), None)
 
 ### Functions
 def preprocess_pipeline(features): #finish
@@ -21,9 +85,9 @@ def preprocess_pipeline(features): #finish
     try:
         PROJECT_ROOT_DIR = "."
         pipeline_path = os.path.join(PROJECT_ROOT_DIR, "model", "pipeline.pkl")
-        feature_transformation_pipeline = joblib.load(pipeline_path)
+        feature_transformation_pipeline = load_artifact(pipeline_path)
     
-    except:
+    except OSError:
         raise ValueError("There is no 'pipeline.pkl'. Please fit and \
                          save pipeline.")
     
@@ -48,23 +112,22 @@ def model_predict(features): #finish
     try:
         PROJECT_ROOT_DIR = "."
         model_path = os.path.join(PROJECT_ROOT_DIR, "model", "best_model.pkl")
-        model = joblib.load(model_path)
+        model = load_artifact(model_path)
     
-    except:
+    except OSError:
         raise ValueError("There is no 'best_model.pkl'. Please fit and \
                          save model.")
         
     predictions = model.predict(features)
     return predictions
 
-def save_predictions(data):
+def prediction_path():
     """
-    Saves predictions to a csv file
+    Creates a timestamped file path for saved predictions
     
-    Parameters:
-    ===========
-    data: DataFrame
-        holds prediction data
+    Returns:
+    ========
+    path: String
     """
     # get date and time for accurate labeling
     now = datetime.now()
@@ -75,48 +138,219 @@ def save_predictions(data):
     path = os.path.join(PROJECT_ROOT_DIR, 
                         "results", 
                         "Salary_Predictions_{}.csv".format(date_string))
+    return path
+
+def save_predictions(data):
+    """
+    Saves predictions to a csv file
+    
+    Parameters:
+    ===========
+    data: DataFrame
+        holds prediction data
+    """
+    # create file path
+    path = prediction_path()
     
     # save file
     data.to_csv(path)
     print("Saved to {}".format(path))
     
-
-def deployment_pipeline(data):
+def score_data(data, timings = None):
     """
-    Pipeline that takes raw data, processes it, and generates predictions
-    using the previously found best model. The best model can be updated
-    by replacing the best model file.
+    Processes raw data and generates predictions without saving them
     
     Parameters: 
     =========== 
     data: DataFrame
         raw data
         
+    timings: dict
+        filled with the seconds spent in each stage if given: preprocess 
+        (dropping the ids included), predict, assemble and total
+        
     Returns:
     ========
     results: DataFrame [jobId, predicted_salary]
     """
-    # copy features to preserve data integrety
-    features = data.copy()
+    start = time.perf_counter()
     
     # save Id
-    jobId = features["jobId"]
+    jobId = data["jobId"]
     
-    # drop unnecessary features
-    selected_features = features.drop(["jobId", "companyId"], axis = 1)
+    # drop unnecessary features (drop returns a new frame)
+    selected_features = data.drop(["jobId", "companyId"], axis = 1)
     
     # get pretrained pipeline
     processed_features = preprocess_pipeline(selected_features)
+    preprocessed = time.perf_counter()
     
     # get predictions
     predictions = model_predict(processed_features)
+    predicted = time.perf_counter()
 
     # combine jobId with predicted salary    
     predictions_with_id = pd.DataFrame({"jobId": jobId, 
                                         "predicted_salary": predictions})
     
+    if timings is not None:
+        assembled = time.perf_counter()
+        timings.update({"preprocess": preprocessed - start,
+                        "predict": predicted - preprocessed,
+                        "assemble": assembled - predicted,
+                        "total": assembled - start})
+    return predictions_with_id
+
+def deployment_pipeline(data):
+    """
+    Pipeline that takes raw data, processes it, and generates predictions
+    using the previously found best model. The best model can be updated
+    by replacing the best model file.
+    
+    Parameters: 
+    =========== 
+    data: DataFrame
+        raw data
+        
+    Returns:
+    ========
+    results: DataFrame [jobId, predicted_salary]
+    """
+    # get predictions
+    predictions_with_id = score_data(data)
+    
     # save predictions as a csv file
     save_predictions(predictions_with_id) 
     
     # return predictions
+    return predictions_with_id
+
+def streaming_deployment_pipeline(input_path, output_path = None, chunksize = 100000):
+    """
+    Streaming version of deployment_pipeline. The raw csv is read in chunks
+    of fixed size and each chunk is scored and appended to the output file,
+    so peak memory is bounded by the chunk size instead of the dataset size.
+    
+    Parameters: 
+    =========== 
+    input_path: String
+        path to the raw csv (same format as test_features.csv)
+        
+    output_path: String
+        path of the prediction csv. A timestamped file in the results 
+        folder is used if None.
+        
+    chunksize: int
+        number of rows scored at a time
+        
+    Returns:
+    ========
+    n_rows: int
+        number of rows scored
+    """
+    if output_path is None:
+        output_path = prediction_path()
+    
+    try:
+        chunks = pd.read_csv(input_path, chunksize = chunksize)
+    except pd.errors.EmptyDataError:
+        # a file without a header holds no rows either
+        chunks = []
+    
+    n_rows = 0
+    for chunk in chunks:
+        # a header-only csv gives one empty chunk
+        if len(chunk) == 0:
+            continue
+        
+        # score the chunk
+        predictions_with_id = score_data(chunk)
+        
+        # write the header with the first chunk and append afterwards
+        predictions_with_id.to_csv(output_path, 
+                                   mode = "w" if n_rows == 0 else "a", 
+                                   header = n_rows == 0)
+        n_rows = n_rows + len(chunk)
+    
+    # empty input still gets a header-only file, like the batch path
+    if n_rows == 0:
+        pd.DataFrame(columns = ["jobId", "predicted_salary"]).to_csv(output_path)
+        
+    print("Saved {} predictions to {}".format(n_rows, output_path))
+    return n_rows
+
+def load_scoring_artifacts():
+    """
+    Loads the pipeline and model through the artifact cache. A missing or
+    unreadable file raises a ValueError naming its path.
+    
+    Returns:
+    ========
+    artifacts: tuple(pipeline, model)
+    """
+    PROJECT_ROOT_DIR = "."
+    artifacts = []
+    for name in ["pipeline.pkl", "best_model.pkl"]:
+        path = os.path.join(PROJECT_ROOT_DIR, "model", name)
+        try:
+            artifacts.append(load_artifact(path))
+        except Exception as error:
+            raise ValueError("Unable to load '{}': {!r}".format(path, error)) from error
+    return tuple(artifacts)
+
+def _init_scoring_worker():
+    """
+    Loads the pipeline and model once per worker process so every shard 
+    scored by the worker reuses the cached artifacts
+    """
+    load_scoring_artifacts()
+
+def parallel_deployment_pipeline(data, n_jobs = -1, n_shards = None, save = True):
+    """
+    Parallel version of deployment_pipeline. The raw data is split into 
+    shards of consecutive rows that are scored on a process pool and merged
+    back in the original jobId order.
+    
+    Parameters: 
+    =========== 
+    data: DataFrame
+        raw data
+        
+    n_jobs: int
+        number of worker processes (-1 uses all cores)
+        
+    n_shards: int
+        number of shards. Defaults to one shard per worker.
+        
+    save: Boolean
+        saves the predictions as a csv file
+        
+    Returns:
+    ========
+    results: DataFrame [jobId, predicted_salary]
+    """
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count()
+    if n_shards is None:
+        n_shards = n_jobs
+    
+    # a bad artifact fails here with its path, in a worker initializer it 
+    # would only surface as a BrokenProcessPool
+    load_scoring_artifacts()
+    
+    # split rows into contiguous shards (no empty shards for small inputs)
+    positions = np.array_split(np.arange(len(data)), min(n_shards, max(len(data), 1)))
+    shards = [data.iloc[index] for index in positions]
+    
+    # executor.map returns results in submission order
+    with ProcessPoolExecutor(max_workers = n_jobs, 
+                             initializer = _init_scoring_worker) as executor:
+        predictions = list(executor.map(score_data, shards))
+    
+    predictions_with_id = pd.concat(predictions)
+    
+    # save predictions as a csv file
+    if save:
+        save_predictions(predictions_with_id)
+        
     return predictions_with_id
\ No newline at end of file
@@ -1,13 +1,491 @@
 ###### libraries ################################################
 import seaborn as sns
 import numpy as np
+import pandas as pd
+import joblib
 import matplotlib.pyplot as plt
 from itertools import combinations
-from results import save_figure
+from results import save_figure, show_saved_figure, figure_is_current, record_figure
+from data_import_functions import categorical_columns, integer_columns, column_fingerprints
+
+###### Aggregate cube ############################################
+class aggregate_cube():
+    """
+    Count, sum and sum of squares of the value columns for every level of
+    the group columns and every pair of group columns, and the sums of 
+    products of the value columns over all rows. Each statistic is a
+    single np.bincount over the rows, and cubes of row chunks can be added,
+    so data that does not fit in memory is aggregated chunk by chunk.
+    
+    Parameters
+    ==========
+    group_columns: list(String) categorical and integer columns
+    value_columns: list(String) numeric columns (Ex: salary), the decimal
+        columns are value columns only
+    pair_values: Boolean keeps the value statistics of the pairs (counts
+        only if False, their mean and std are NaN)
+    
+    Methods
+    =======
+    update: adds the rows of a dataframe
+    counts: number of rows per level
+    stats: count, mean and std of a value column per level
+    pair_stats: count, mean and std of a value column per pair of levels
+    """
+    def __init__(self, group_columns, value_columns, pair_values = True):
+        self.group_columns = list(group_columns)
+        self.value_columns = list(value_columns)
+        self.pair_values = pair_values
+        self.levels = {col: None for col in self.group_columns}
+        self.keys = [(col,) for col in self.group_columns] + list(combinations(self.group_columns, 2))
+        
+        n_values = {key: len(self.value_columns) if len(key) == 1 or pair_values else 0 for key in self.keys}
+        self.count = {key: np.zeros((0,)*len(key)) for key in self.keys}
+        self.sum = {key: np.zeros((0,)*len(key) + (n_values[key],)) for key in self.keys}
+        self.sumsq = {key: np.zeros((0,)*len(key) + (n_values[key],)) for key in self.keys}
+        self.cross = np.zeros((len(self.value_columns), len(self.value_columns)))
+        
+    def _add_levels(self, col, new_levels):
+        # new levels go at the end, the statistics get zero rows for them
+        # (plain values: a CategoricalIndex would be reordered by MultiIndex.from_product)
+        new_levels = pd.Index(np.asarray(new_levels))
+        levels = self.levels[col]
+        self.levels[col] = new_levels if levels is None else levels.append(new_levels)
+        
+        for key in self.keys:
+            if col in key:
+                for store in [self.count, self.sum, self.sumsq]:
+                    padding = [(0, 0)] * store[key].ndim
+                    padding[key.index(col)] = (0, len(new_levels))
+                    store[key] = np.pad(store[key], padding)
+    
+    def _codes(self, col, values):
+        # one hash pass over the rows (none for a category column), then the
+        # few unique values are mapped to the cube levels by value, so a 
+        # category column and its object version give the same statistics
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        
+        levels = self.levels[col]
+        new_levels = uniques if levels is None else uniques[levels.get_indexer(uniques) < 0]
+        if len(new_levels):
+            self._add_levels(col, new_levels)
+        
+        # missing values keep the code -1
+        mapping = np.append(self.levels[col].get_indexer(uniques), -1)
+        return mapping[codes]
+    
+    def update(self, data):
+        """
+        Parameters:
+        ===========
+        data: dataframe holding the group and value columns
+        """
+        codes = {col: self._codes(col, data[col]) for col in self.group_columns}
+        # column by column, selecting a list of columns consolidates the frame
+        values = np.column_stack([data[col].to_numpy(dtype = np.float64) for col in self.value_columns])
+        
+        # rows with a missing level are left out
+        valid = np.logical_and.reduce([code >= 0 for code in codes.values()])
+        if not valid.all():
+            codes = {col: code[valid] for col, code in codes.items()}
+            values = values[valid]
+        squares = values ** 2
+        self.cross += values.T @ values
+        
+        for key in self.keys:
+            shape = self.count[key].shape
+            size = int(np.prod(shape))
+            index = np.ravel_multi_index([codes[col] for col in key], shape)
+            
+            self.count[key] += np.bincount(index, minlength = size).reshape(shape)
+            for j in range(self.sum[key].shape[-1]):
+                self.sum[key][..., j] += np.bincount(index, weights = values[:, j], minlength = size).reshape(shape)
+                self.sumsq[key][..., j] += np.bincount(index, weights = squares[:, j], minlength = size).reshape(shape)
+        return self
+    
+    def __add__(self, other):
+        if self.group_columns != other.group_columns or self.value_columns != other.value_columns \
+           or self.pair_values != other.pair_values:
+            raise ValueError("Only cubes of the same columns can be added.")
+        
+        combined = aggregate_cube(self.group_columns, self.value_columns, self.pair_values)
+        for cube in [self, other]:
+            combined.cross += cube.cross
+            for col in combined.group_columns:
+                if cube.levels[col] is not None:
+                    new_levels = cube.levels[col].difference(combined.levels[col], sort = False) \
+                                 if combined.levels[col] is not None else cube.levels[col]
+                    if len(new_levels):
+                        combined._add_levels(col, new_levels)
+            
+            for key in combined.keys:
+                if min(cube.count[key].shape) == 0:
+                    continue
+                index = np.ix_(*[combined.levels[col].get_indexer(cube.levels[col]) for col in key])
+                combined.count[key][index] += cube.count[key]
+                combined.sum[key][index] += cube.sum[key]
+                combined.sumsq[key][index] += cube.sumsq[key]
+        return combined
+    
+    def _frame(self, key, value_col):
+        # statistics of a key in the order of the requested columns
+        transpose = key not in self.count
+        stored = key[::-1] if transpose else key
+        j = self.value_columns.index(value_col)
+        count = self.count[stored]
+        if self.sum[stored].shape[-1]:
+            total, squares = self.sum[stored][..., j], self.sumsq[stored][..., j]
+        else:
+            # counts only (pair_values = False)
+            total = squares = np.full(count.shape, np.nan)
+        if transpose:
+            count, total, squares = count.T, total.T, squares.T
+        
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            mean = total / count
+            std = np.sqrt(np.maximum(squares - count * mean ** 2, 0) / (count - 1))
+        
+        index = pd.MultiIndex.from_product([self.levels[col] for col in key], names = list(key))
+        stats = pd.DataFrame({"count": count.ravel(), "mean": mean.ravel(), "std": std.ravel()}, 
+                             index = index)
+        
+        # only observed levels, sorted like groupby
+        stats = stats[stats["count"] > 0].sort_index()
+        stats["count"] = stats["count"].astype(np.int64)
+        return stats
+    
+    def counts(self, col, by = None):
+        """
+        Returns:
+        ========
+        counts: Series of the number of rows per level of col, indexed by
+            (level of by, level of col) if by is given
+        """
+        if col not in self.group_columns or (by is not None and by not in self.group_columns):
+            raise ValueError("'{}' is not a group column of the cube.".format(col if by is None else (by, col)))
+        if by is None:
+            return self.stats(col, self.value_columns[0])["count"]
+        return self._frame((by, col), self.value_columns[0])["count"]
+    
+    def stats(self, col, value_col):
+        """
+        Returns:
+        ========
+        stats: DataFrame[count, mean, std] of value_col indexed by the levels of col
+        """
+        stats = self._frame((col,), value_col)
+        stats.index = stats.index.get_level_values(0)
+        return stats
+    
+    def pair_stats(self, col_1, col_2, value_col):
+        """
+        Returns:
+        ========
+        stats: DataFrame[col_1, col_2, count, mean, std] of value_col for 
+            every observed pair of levels
+        """
+        return self._frame((col_1, col_2), value_col).reset_index()
+
+def build_cube(data, target_col, chunksize = 1000000, correlation_only = False):
+    """
+    Aggregates the categorical (except ids) and integer columns of the data,
+    the decimal columns are value columns only
+    
+    Parameters:
+    ===========
+    data: training dataframe or iterable of dataframe chunks
+    target_col: name of dependent variable
+    chunksize: int number of rows aggregated at a time
+    correlation_only: Boolean keeps only what target_encoded_corr needs:
+        the target and decimal sums per level, the counts per pair of levels
+        and the products of the value columns
+    
+    Returns:
+    ========
+    cube: aggregate_cube
+    """
+    chunks = data
+    if isinstance(data, pd.DataFrame):
+        chunks = (data.iloc[start:start + chunksize] for start in range(0, len(data), chunksize))
+    
+    cube = None
+    for chunk in chunks:
+        if cube is None:
+            value_columns = list(integer_columns(chunk))
+            if target_col not in value_columns:
+                value_columns.append(target_col)
+            decimals = [col for col in chunk.select_dtypes("number").columns if col not in value_columns]
+            value_columns += decimals
+            group_columns = list(categorical_columns(chunk).drop(["jobId", "companyId"], errors = "ignore")) \
+                            + list(integer_columns(chunk))
+            if correlation_only:
+                group_columns = [col for col in group_columns if col != target_col]
+                value_columns = [target_col] + decimals
+            cube = aggregate_cube(group_columns, value_columns, pair_values = not correlation_only)
+        cube.update(chunk)
+    return cube
+
+def target_encoded_corr(cube, target_col, columns = None):
+    """
+    Correlation matrix of the data with every categorical column replaced by
+    the target average of its levels (same as data.corr() after a groupby 
+    transform("mean") of each column). The cross moments come from the level
+    counts, the value sums per level and the value products of the cube, so
+    a cube aggregated chunk by chunk gives the matrix of data that does not
+    fit in memory.
+    
+    Parameters:
+    ===========
+    cube: aggregate_cube of the data
+    target_col: name of dependent variable (a value column of the cube)
+    columns: list(String) columns in the order of the matrix (all group 
+        and value columns if None)
+    
+    Returns:
+    ========
+    corr: DataFrame correlation matrix
+    """
+    if columns is None:
+        columns = cube.group_columns + [col for col in cube.value_columns if col not in cube.group_columns]
+    # group columns are used by level, the target and decimal columns row by row
+    variables = [col for col in columns if col in cube.group_columns and col != target_col]
+    values = [col for col in columns if col not in variables]
+    j = cube.value_columns.index(target_col)
+    
+    # value column moments
+    level_sums = cube.sum[(cube.group_columns[0],)]
+    n = cube.count[(cube.group_columns[0],)].sum()
+    means = level_sums.sum(axis = 0) / n
+    index = {col: cube.value_columns.index(col) for col in values}
+    
+    # centered value of every level: target average or the integer itself
+    centered = {}
+    for col in variables:
+        count = cube.count[(col,)]
+        if pd.api.types.is_numeric_dtype(cube.levels[col]):
+            level_values = np.asarray(cube.levels[col], dtype = np.float64)
+        else:
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                level_values = np.where(count > 0, cube.sum[(col,)][..., j] / count, 0)
+        centered[col] = level_values - (count * level_values).sum() / n
+    
+    cov = pd.DataFrame(0.0, index = columns, columns = columns)
+    for a, col_1 in enumerate(variables):
+        count = cube.count[(col_1,)]
+        cov.loc[col_1, col_1] = (count * centered[col_1] ** 2).sum()
+        for col_2 in values:
+            k = index[col_2]
+            value_sums = cube.sum[(col_1,)][..., k] - count * means[k]
+            cov.loc[col_1, col_2] = cov.loc[col_2, col_1] = (centered[col_1] * value_sums).sum()
+        
+        # cross moments from the pair counts
+        for col_2 in variables[a + 1:]:
+            pair = cube.count[(col_1, col_2)] if (col_1, col_2) in cube.count else cube.count[(col_2, col_1)].T
+            cov.loc[col_1, col_2] = cov.loc[col_2, col_1] = centered[col_1] @ pair @ centered[col_2]
+    
+    # cross moments of the value columns
+    for col_1 in values:
+        for col_2 in values:
+            k_1, k_2 = index[col_1], index[col_2]
+            cov.loc[col_1, col_2] = cube.cross[k_1, k_2] - n * means[k_1] * means[k_2]
+    std = np.sqrt(np.diag(cov.to_numpy()))
+    return cov / np.outer(std, std)
+
+### Summary rendering
+def _weighted_percentile(values, counts, q):
+    """
+    np.percentile (linear interpolation) of the rows where values[i] 
+    appears counts[i] times
+    """
+    order = np.argsort(values)
+    values, cumulative = values[order], np.cumsum(counts[order])
+    
+    position = np.asarray(q) / 100 * (cumulative[-1] - 1)
+    lower = np.floor(position)
+    # the k-th smallest row is the first value whose cumulative count exceeds k
+    low = values[np.searchsorted(cumulative, lower, side = "right")]
+    high = values[np.searchsorted(cumulative, np.minimum(lower + 1, cumulative[-1] - 1), side = "right")]
+    return low + (position - lower) * (high - low)
+
+def box_stats(values, counts, label = "", whis = 1.5, max_fliers = None, random_state = 42):
+    """
+    Exact boxplot statistics from the counts of every distinct value
+    
+    Parameters:
+    ===========
+    values: array of distinct values
+    counts: array of the number of rows of each value
+    label: String name of the box
+    whis: float whisker length in IQR (same as plt.boxplot)
+    max_fliers: int maximum number of outlier markers, sampled with 
+        probability proportional to their counts (all outliers if None)
+    random_state: int seed of the outlier sample
+    
+    Returns:
+    ========
+    stats: dict for Axes.bxp
+    """
+    values, counts = np.asarray(values, dtype = np.float64), np.asarray(counts)
+    values, counts = values[counts > 0], counts[counts > 0]
+    
+    q1, median, q3 = _weighted_percentile(values, counts, [25, 50, 75])
+    iqr = q3 - q1
+    inside = (values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)
+    
+    fliers, flier_counts = values[~inside], counts[~inside]
+    if max_fliers is not None and len(fliers) > max_fliers:
+        rng = np.random.RandomState(random_state)
+        fliers = rng.choice(fliers, max_fliers, replace = False, p = flier_counts / flier_counts.sum())
+    
+    return {"label": label,
+            "mean": np.average(values, weights = counts),
+            "med": median,
+            "q1": q1,
+            "q3": q3,
+            "whislo": values[inside].min() if inside.any() else q1,
+            "whishi": values[inside].max() if inside.any() else q3,
+            "fliers": fliers}
+
+def summary_boxplot(counts, order = None, vert = True, color = None, max_fliers = None, ax = None):
+    """
+    Draws boxplots from exact value counts (aggregate_cube.counts) instead 
+    of the raw rows
+    
+    Parameters:
+    ===========
+    counts: Series of rows per value, or per (level, value) for one box per level
+    order: list of levels in the order of the boxes
+    vert: Boolean vertical boxes
+    color: color of the boxes
+    max_fliers: int maximum number of outlier markers per box
+    ax: matplotlib axes (current axes if None)
+    """
+    ax = plt.gca() if ax is None else ax
+    if counts.index.nlevels == 1:
+        groups = [("", counts)]
+    else:
+        levels = order if order is not None else counts.index.get_level_values(0).unique()
+        groups = [(level, counts.xs(level, level = 0)) for level in levels]
+    
+    stats = [box_stats(level_counts.index, level_counts.to_numpy(), label = level, max_fliers = max_fliers)
+             for level, level_counts in groups]
+    ax.bxp(stats, 
+           vert = vert, 
+           patch_artist = True,
+           boxprops = {"facecolor": color if color is not None else sns.color_palette()[0]},
+           medianprops = {"color": ".15"},
+           flierprops = {"marker": "d", "markerfacecolor": ".15", "markersize": 4})
+    return ax
+
+def summary_histplot(counts, bins = 50):
+    """
+    Draws a histogram from exact value counts (same bins as sns.histplot 
+    of the raw rows)
+    
+    Parameters:
+    ===========
+    counts: Series of rows per value
+    bins: int number of bins
+    """
+    return sns.histplot(x = np.asarray(counts.index, dtype = np.float64), 
+                        weights = counts.to_numpy(), 
+                        bins = bins)
+
+### Figure cache
+def figure_key(function, data, columns, fingerprints = None, **params):
+    """
+    Key of a figure in images/manifest.json: content hashes of the columns
+    the figure is drawn from and its parameters
+    
+    Parameters:
+    ===========
+    function: String name of the plot function
+    data: training dataframe
+    columns: list(String) columns the figure is drawn from
+    fingerprints: dict precomputed column_fingerprints of the data
+    params: parameters that change the figure
+    
+    Returns:
+    ========
+    key: String
+    """
+    if fingerprints is None:
+        fingerprints = column_fingerprints(data, columns)
+    return joblib.hash((function, [(col, fingerprints[col]) for col in columns], sorted(params.items())))
+
+def eda_figure_key(function, data, fingerprints = None, **kwargs):
+    """
+    Key of a figure of the EDA plot functions. The plot functions and 
+    EDA_report both use it, so a figure drawn by one is reused by the other.
+    
+    Parameters:
+    ===========
+    function: String name of the plot function (Ex: "num_eda_plots")
+    data: training dataframe
+    fingerprints: dict precomputed column_fingerprints of the data
+    kwargs: arguments of the plot function (col, cat_var, target_col, 
+        summary, max_fliers, ...)
+    
+    Returns:
+    ========
+    key: String
+    """
+    # the columns each figure is drawn from and the options that change it
+    options = {"summary": kwargs.get("summary", False), "max_fliers": kwargs.get("max_fliers")}
+    if function in ["num_eda_plots", "cat_eda_plot"]:
+        columns = [kwargs["col"], kwargs["target_col"]]
+    elif function == "target_num_eda":
+        columns = [kwargs["target_col"]]
+    elif function == "cat_num_interaction_plots":
+        columns = [kwargs["cat_var"]] + list(integer_columns(data).drop("salary")[:2])
+    elif function == "cat_cat_interaction_plot":
+        columns, options = [kwargs["cat_var_1"], kwargs["cat_var_2"], "salary"], {}
+    elif function == "corr_heat_map":
+        columns = list(data.columns.drop(["jobId", "companyId"]))
+        options = {"target_col": kwargs["target_col"]}
+    else:
+        raise ValueError("'{}' is not an EDA plot function.".format(function))
+    return figure_key(function, data, columns, fingerprints, **options)
+
+def _reuse_figure(fig_name, key):
+    # shows the saved figure if it was drawn from the same inputs
+    if key is not None and figure_is_current(fig_name, key):
+        show_saved_figure(fig_name)
+        return True
+    return False
+
+def _save_and_record(fig_name, key):
+    save_figure(fig_name)
+    if key is not None:
+        record_figure(fig_name, key)
+
+def _lazy_cube(data, target_col):
+    """
+    Returns a function building the cube of the data on its first call, so
+    a report whose figures are all unchanged never aggregates the data
+    """
+    cube = []
+    def get_cube():
+        if not cube:
+            cube.append(build_cube(data, target_col))
+        return cube[0]
+    return get_cube
+
+def _get_cube(cube, data, target_col):
+    # cube given, built on demand by a driver, or built from the needed columns
+    if cube is None:
+        return build_cube(data, target_col)
+    if callable(cube):
+        return cube()
+    return cube
 
 ###### Functions #################################################
 ### Numerical data
-def num_eda_plots(data, col, target_col):
+def num_eda_plots(data, col, target_col, cube = None, summary = False, max_fliers = None, 
+                  cache = True, fingerprints = None):
     """
     Creates 3 EDA plots: [lineplot, boxplot, histogram]
     
@@ -16,7 +494,18 @@ def num_eda_plots(data, col, target_col):
     data: training dataframe
     col: feature name that we want to plot
     target_col: name of dependent variable
+    cube: aggregate_cube of the data (built from col and target_col if None)
+    summary: Boolean draws the boxplot and histogram from the cube counts
+    max_fliers: int maximum number of outlier markers in summary mode
+    cache: Boolean reuses the saved figure when its inputs are unchanged
+    fingerprints: dict precomputed column_fingerprints of the data
     """
+    fig_name = "num_eda_plot_{}".format(col)
+    key = eda_figure_key("num_eda_plots", data, fingerprints, col = col, target_col = target_col, 
+                         summary = summary, max_fliers = max_fliers) if cache else None
+    if _reuse_figure(fig_name, key):
+        return
+    cube = _get_cube(cube, data[[col, target_col]] if cube is None else data, target_col)
     
     plt.figure(figsize = (12, 4))
     sns.set_style("darkgrid")
@@ -26,10 +515,9 @@ def num_eda_plots(data, col, target_col):
     ### line plot
     plt.subplot(1, 3, 1)
     # Break num var into chunks to get mean/std of chunk
-    y_mean = data.groupby([col]).mean()
-    y_mean = y_mean[target_col]
-    y_std = data.groupby([col]).std()
-    y_std = y_std[target_col]
+    col_stats = cube.stats(col, target_col)
+    y_mean = col_stats["mean"]
+    y_std = col_stats["std"]
 
     # get x variable
     x = y_mean.index
@@ -42,17 +530,26 @@ def num_eda_plots(data, col, target_col):
     
     ### box plot
     plt.subplot(1, 3, 2)    
-    sns.boxplot(data = data, x = col)
+    if summary:
+        summary_boxplot(cube.counts(col), vert = False, max_fliers = max_fliers)
+        plt.xlabel(col)
+        plt.yticks([])
+    else:
+        sns.boxplot(data = data, x = col)
     
     ### histogram
     plt.subplot(1, 3, 3)
-    sns.histplot(data, x = col, bins = 50)
+    if summary:
+        summary_histplot(cube.counts(col))
+        plt.xlabel(col)
+    else:
+        sns.histplot(data, x = col, bins = 50)
     plt.ylabel(" ")
     
     # save plot
-    save_figure("num_eda_plot_{}".format(col))
+    _save_and_record(fig_name, key)
 
-def num_eda(data, target_col):
+def num_eda(data, target_col, cube = None, summary = False, max_fliers = None, cache = True):
     """
     Automatically feeds numerical columns into the plotting function
     
@@ -60,13 +557,24 @@ def num_eda(data, target_col):
     ===========
     data: training dataframe
     target_col: name of dependent variable
+    cube: aggregate_cube of the data (built once if None)
+    summary: Boolean draws boxplots and histograms from the cube counts
+    max_fliers: int maximum number of outlier markers in summary mode
+    cache: Boolean reuses the saved figures whose inputs are unchanged
     """
+    num_variables = integer_columns(data).drop(target_col)
+    fingerprints = column_fingerprints(data, list(num_variables) + [target_col]) if cache else None
+    if cube is None:
+        cube = _lazy_cube(data, target_col)
     
-    for col in data.columns[data.dtypes == "int64"].drop(target_col):
-        num_eda_plots(data = data, col = col, target_col = target_col)
+    for col in num_variables:
+        num_eda_plots(data = data, col = col, target_col = target_col, cube = cube, 
+                      summary = summary, max_fliers = max_fliers, 
+                      cache = cache, fingerprints = fingerprints)
 
 ### Target Feature - Numerical
-def target_num_eda(data, target_col):
+def target_num_eda(data, target_col, cube = None, summary = False, max_fliers = None, 
+                   cache = True, fingerprints = None):
     """
     Creates 2 EDA plots: [boxplot, histogram]
     
@@ -75,7 +583,20 @@ def target_num_eda(data, target_col):
     data: training dataframe
     col: feature name that we want to plot
     target_col: name of dependent variable
+    cube: aggregate_cube of the data (built from target_col if None)
+    summary: Boolean draws the boxplot and histogram from the cube counts
+    max_fliers: int maximum number of outlier markers in summary mode
+    cache: Boolean reuses the saved figure when its inputs are unchanged
+    fingerprints: dict precomputed column_fingerprints of the data
     """
+    fig_name = "target_eda_plot_{}".format(target_col)
+    key = eda_figure_key("target_num_eda", data, fingerprints, target_col = target_col, 
+                         summary = summary, max_fliers = max_fliers) if cache else None
+    if _reuse_figure(fig_name, key):
+        return
+    if summary:
+        cube = _get_cube(cube, data[[target_col]] if cube is None else data, target_col)
+        
     plt.figure(figsize = (10, 4))
     sns.set_style("darkgrid")
     plt.suptitle("Distribution of {}".format(target_col))
@@ -83,18 +604,28 @@ def target_num_eda(data, target_col):
     
     ### boxplot
     plt.subplot(1, 2, 1)
-    sns.boxplot(data = data, x = target_col)
+    if summary:
+        summary_boxplot(cube.counts(target_col), vert = False, max_fliers = max_fliers)
+        plt.xlabel(target_col)
+        plt.yticks([])
+    else:
+        sns.boxplot(data = data, x = target_col)
     
     ### histogram
     plt.subplot(1, 2, 2)
-    sns.histplot(data = data, x = target_col, bins = 50)
+    if summary:
+        summary_histplot(cube.counts(target_col))
+        plt.xlabel(target_col)
+    else:
+        sns.histplot(data = data, x = target_col, bins = 50)
     plt.ylabel(" ")
 
     # save plot
-    save_figure("target_eda_plot_{}".format(target_col))
+    _save_and_record(fig_name, key)
     
 ### Categorical Features
-def cat_eda_plot(data, col, target_col):
+def cat_eda_plot(data, col, target_col, cube = None, summary = False, max_fliers = None, 
+                 cache = True, fingerprints = None):
     """
     Creates 2 EDA plots: [histogram, boxplot]
     
@@ -103,7 +634,18 @@ def cat_eda_plot(data, col, target_col):
     data: training dataframe
     col: feature name that we want to plot
     target_col: name of dependent variable
+    cube: aggregate_cube of the data (built from col and target_col if None)
+    summary: Boolean draws the boxplot from the cube counts
+    max_fliers: int maximum number of outlier markers per box in summary mode
+    cache: Boolean reuses the saved figure when its inputs are unchanged
+    fingerprints: dict precomputed column_fingerprints of the data
     """
+    fig_name = "cat_eda_plot_{}".format(col)
+    key = eda_figure_key("cat_eda_plot", data, fingerprints, col = col, target_col = target_col, 
+                         summary = summary, max_fliers = max_fliers) if cache else None
+    if _reuse_figure(fig_name, key):
+        return
+    cube = _get_cube(cube, data[[col, target_col]] if cube is None else data, target_col)
         
     plt.figure(figsize = (12, 6))
     sns.set(font_scale = 1.2)
@@ -112,26 +654,33 @@ def cat_eda_plot(data, col, target_col):
 
     ### histogram
     plt.subplot(1, 2, 1)
-    counts = np.array(data[col].value_counts().sort_values(ascending = False))
-    index = np.array(data[col].value_counts().sort_values(ascending = False).index)
+    level_counts = cube.counts(col).sort_values(ascending = False)
+    counts = np.array(level_counts)
+    index = np.array(level_counts.index)
     sns.barplot(x = index, y = counts, color = "salmon") 
     plt.xticks(rotation = 90)
     plt.legend([],[], frameon=False)
 
     ### boxplot
     plt.subplot(1, 2, 2)    
-    col_means = data.groupby(col).mean()
-    x_index = col_means[target_col].sort_values(ascending = False).index
-    sns.boxplot(data = data, x = col, y = target_col, color = "cornflowerblue" , order = x_index) 
+    col_means = cube.stats(col, target_col)["mean"]
+    x_index = col_means.sort_values(ascending = False).index
+    if summary:
+        summary_boxplot(cube.counts(target_col, by = col), order = x_index, 
+                        color = "cornflowerblue", max_fliers = max_fliers)
+        plt.xlabel(col)
+        plt.ylabel(target_col)
+    else:
+        sns.boxplot(data = data, x = col, y = target_col, color = "cornflowerblue" , order = x_index) 
     plt.xticks(rotation = 90)
     plt.legend([],[], frameon=False)
     
     plt.tight_layout()
     
     # save plot
-    save_figure("cat_eda_plot_{}".format(col))
+    _save_and_record(fig_name, key)
     
-def cat_eda(data, target_col):
+def cat_eda(data, target_col, cube = None, summary = False, max_fliers = None, cache = True):
     """
     Automatically feeds categorical columns into the plotting function
     
@@ -139,13 +688,24 @@ def cat_eda(data, target_col):
     ===========
     data: training dataframe
     target_col: name of dependent variable
+    cube: aggregate_cube of the data (built once if None)
+    summary: Boolean draws boxplots from the cube counts
+    max_fliers: int maximum number of outlier markers per box in summary mode
+    cache: Boolean reuses the saved figures whose inputs are unchanged
     """
+    cat_variables = categorical_columns(data).drop(["jobId", "companyId"])
+    fingerprints = column_fingerprints(data, list(cat_variables) + [target_col]) if cache else None
+    if cube is None:
+        cube = _lazy_cube(data, target_col)
     
-    for col in data.columns[data.dtypes == "O"].drop(["jobId", "companyId"]):
-        cat_eda_plot(data = data, col = col, target_col = target_col)        
+    for col in cat_variables:
+        cat_eda_plot(data = data, col = col, target_col = target_col, cube = cube, 
+                     summary = summary, max_fliers = max_fliers, 
+                     cache = cache, fingerprints = fingerprints)        
 
 ### Interactions
-def cat_num_interaction_plots(data, cat_var):
+def cat_num_interaction_plots(data, cat_var, cube = None, summary = False, max_fliers = None, 
+                              cache = True, fingerprints = None):
     """
     Plots 2 boxplots between a categorical variable and the numeric variables
     
@@ -156,13 +716,28 @@ def cat_num_interaction_plots(data, cat_var):
         name of the categorical variable
     num_var: String
         name of the numeric variable
+    cube: aggregate_cube of the data (built once if None in summary mode)
+    summary: Boolean
+        draws the boxplots from the cube counts
+    max_fliers: int
+        maximum number of outlier markers per box in summary mode
+    cache: Boolean
+        reuses the saved figure when its inputs are unchanged
+    fingerprints: dict
+        precomputed column_fingerprints of the data
     """
     # get variables
-    cat_variables = data.columns[data.dtypes == "O"]
-    num_variables = data.columns[data.dtypes == "int64"].drop("salary")
+    cat_variables = categorical_columns(data)
+    num_variables = integer_columns(data).drop("salary")
     
     # guard condition
     if cat_var in cat_variables:
+        fig_name = "cat_num_interaction_plots_{}".format(cat_var)
+        key = eda_figure_key("cat_num_interaction_plots", data, fingerprints, cat_var = cat_var, 
+                             summary = summary, max_fliers = max_fliers) if cache else None
+        if _reuse_figure(fig_name, key):
+            return
+        
         # plot formating
         fig, axes = plt.subplots(1, 2, sharex=True, figsize=(10,5))
         fig.suptitle('{}'.format(cat_var))
@@ -170,27 +745,39 @@ def cat_num_interaction_plots(data, cat_var):
         sns.set(font_scale = 1.1)
         plt.tight_layout()
         
+        if summary:
+            columns = [cat_var] + list(num_variables) + ["salary"]
+            cube = _get_cube(cube, data[columns] if cube is None else data, "salary")
+        
         # yearsExperience
-        p1 = sns.boxplot(data = data, x = cat_var, y = num_variables[0], ax = axes[0])
+        if summary:
+            p1 = summary_boxplot(cube.counts(num_variables[0], by = cat_var), 
+                                 max_fliers = max_fliers, ax = axes[0])
+        else:
+            p1 = sns.boxplot(data = data, x = cat_var, y = num_variables[0], ax = axes[0])
         p1.set_xlabel("{}".format(cat_var))
         p1.set_ylabel("{}".format(num_variables[0]))
         axes[0].tick_params(axis='x', rotation=90)
         
         # milesFromMetropolis
-        p2 = sns.boxplot(data = data, x = cat_var, y = num_variables[1], ax = axes[1])
+        if summary:
+            p2 = summary_boxplot(cube.counts(num_variables[1], by = cat_var), 
+                                 max_fliers = max_fliers, ax = axes[1])
+        else:
+            p2 = sns.boxplot(data = data, x = cat_var, y = num_variables[1], ax = axes[1])
         p2.set_xlabel("{}".format(cat_var))
         p2.set_ylabel("{}".format(num_variables[1]))
         axes[1].tick_params(axis='x', rotation=90)
         
         # save plot
-        save_figure("cat_num_interaction_plots_{}".format(cat_var))
+        _save_and_record(fig_name, key)
     
         plt.show()
         
     else:
         print("Please give a categorical and numeric variable")
         
-def cat_cat_interaction_plot(data, cat_var_1, cat_var_2):
+def cat_cat_interaction_plot(data, cat_var_1, cat_var_2, cube = None, cache = True, fingerprints = None):
     """
     Plots a lineplot between 2 categorical variables in the data
     
@@ -201,15 +788,28 @@ def cat_cat_interaction_plot(data, cat_var_1, cat_var_2):
         name of the 1st categorical variable
     cat_var_2: String
         name of the 2nd categorical variable
+    cube: aggregate_cube of the data (built from the 2 variables if None)
+    cache: Boolean
+        reuses the saved figure when its inputs are unchanged
+    fingerprints: dict
+        precomputed column_fingerprints of the data
     """
     # set target variable
     target_variable = "salary"
     
     # plot
     if (cat_var_1 in data.columns and cat_var_2 in data.columns):        
+        fig_name = "cat_cat_interaction_plot_{}_{}".format(cat_var_1, cat_var_2)
+        key = eda_figure_key("cat_cat_interaction_plot", data, fingerprints, 
+                             cat_var_1 = cat_var_1, cat_var_2 = cat_var_2) if cache else None
+        if _reuse_figure(fig_name, key):
+            return
+        
         # target variable
-        variable_averages = data.groupby([cat_var_1, cat_var_2], as_index = False).mean() \
-                                .drop(["yearsExperience", "milesFromMetropolis"], axis = 1)
+        columns = [cat_var_1, cat_var_2, target_variable]
+        cube = _get_cube(cube, data[columns] if cube is None else data, target_variable)
+        variable_averages = cube.pair_stats(cat_var_1, cat_var_2, target_variable) \
+                                .rename(columns = {"mean": target_variable})
         
         # plot
         sns.set(style="darkgrid")
@@ -225,56 +825,76 @@ def cat_cat_interaction_plot(data, cat_var_1, cat_var_2):
         tic = plt.xticks(rotation=90)
         
         # save plot
-        save_figure("cat_cat_interaction_plot_{}_{}".format(cat_var_1, cat_var_2))
+        _save_and_record(fig_name, key)
     
         plt.show()
     # guard statement
     else:
         print("Please enter 2 feature labels.")  
 
-def interaction_plots(data):
+def interaction_plots(data, cube = None, summary = False, max_fliers = None, cache = True):
     """
     Automatically feeds categorical columns into the plotting functions
     
     Parameters:
     ===========
     data: training dataframe
+    cube: aggregate_cube of the data (built once if None)
+    summary: Boolean draws boxplots from the cube counts
+    max_fliers: int maximum number of outlier markers per box in summary mode
+    cache: Boolean reuses the saved figures whose inputs are unchanged
     """
     # get variables
-    cat_variables = data.columns[data.dtypes == "O"].drop(["jobId", "companyId"])
+    cat_variables = categorical_columns(data).drop(["jobId", "companyId"])
+    columns = list(cat_variables) + list(integer_columns(data))
+    fingerprints = column_fingerprints(data, columns) if cache else None
+    if cube is None:
+        cube = _lazy_cube(data, "salary")
     
     # cat vs. num
     print('\n{0:*^80}\n'.format(' Categorical vs Numerical '))
     for col in cat_variables:
-        cat_num_interaction_plots(data = data, cat_var = col)
+        cat_num_interaction_plots(data = data, cat_var = col, cube = cube, 
+                                  summary = summary, max_fliers = max_fliers, 
+                                  cache = cache, fingerprints = fingerprints)
     
     # cat vs. cat
     print('\n{0:*^80}\n'.format(' Categorical vs Categorical '))   
     for comb in combinations(cat_variables, 2):
-        cat_cat_interaction_plot(data = data, cat_var_1 = comb[0], cat_var_2 = comb[1])
+        cat_cat_interaction_plot(data = data, cat_var_1 = comb[0], cat_var_2 = comb[1], cube = cube, 
+                                 cache = cache, fingerprints = fingerprints)
 
 ### interactions
-def corr_heat_map(data, target_col):
+def corr_heat_map(data, target_col, cube = None, cache = True):
     """
     Creates a correlation heat map with all variables except jobId and companyId
     
     Parameters:
     ===========
     data: training dataframe
+    target_col: name of dependent variable
+    cube: aggregate_cube of the data (built if None)
+    cache: Boolean reuses the saved figure when the data is unchanged
     """
-    # make sure that ID's are dropped
-    data = data.drop(["jobId", "companyId"], axis = 1)
+    # make sure that ID's are dropped (by name, the data is not copied)
+    variables = list(data.columns.drop(["jobId", "companyId"]))
+    
+    key = eda_figure_key("corr_heat_map", data, target_col = target_col) if cache else None
+    if _reuse_figure("corr_heat_map", key):
+        return
     
     # transform categorical levels into numerical using level averages
-    cat_variables = data.columns[data.dtypes == "O"]
-    for col in cat_variables:
-        data[col] = data.groupby(col)[target_col].transform("mean")
+    if cube is None:
+        cube = build_cube(data, target_col, correlation_only = True)
+    cube = _get_cube(cube, data, target_col)
+    columns = [col for col in variables if col in cube.group_columns or col in cube.value_columns]
+    corr = target_encoded_corr(cube, target_col, columns)
         
     # create heatmap
     plt.figure(figsize = (12, 10))
-    sns.heatmap(data = data.corr(), cmap = "rocket", annot = True)
+    sns.heatmap(data = corr, cmap = "rocket", annot = True)
     plt.xticks(rotation = 90)
     
     # save plot
-    save_figure("corr_heat_map")
+    _save_and_record("corr_heat_map", key)
  
@@ -0,0 +1,154 @@
+# libraries
+import numpy as np
+import os
+import copy
+from sklearn.preprocessing import StandardScaler
+from Gram_functions import gram_fit, frame_chunks
+from Deployment_helper import load_artifact
+from results import save_model
+
+"""
+Incremental updates of the deployed polynomial linear model.
+
+The model state saved next to best_model.pkl holds the sufficient statistics
+of every labeled row seen so far (Gram matrix, X'y and target moments) and
+the running moments of the StandardScaler columns. New labeled rows are
+folded into the statistics and the model is solved again, in time that
+only depends on the size of the new batch.
+
+The feature pipeline stays frozen between updates so the Gram matrix of
+old rows stays valid. This does not change the least squares predictions:
+the polynomial features span the same space for any scaling of the numeric
+columns. The running scaler moments are kept to monitor drift and for the
+next full retrain.
+"""
+
+### Functions
+def _scalers(pipeline):
+    """
+    StandardScaler blocks of the pipeline's ColumnTransformer
+
+    Returns:
+    ========
+    scalers: list of (name, StandardScaler, columns)
+    """
+    preprocess = pipeline.steps[0][1]
+    return [(name, transformer, list(columns)) for name, transformer, columns
+            in preprocess.transformers_ if isinstance(transformer, StandardScaler)]
+
+def _scaler_moments(scaler):
+    """
+    Running moments of a fitted StandardScaler
+    """
+    return {"n_samples_seen": int(np.max(scaler.n_samples_seen_)),
+            "mean": np.array(scaler.mean_),
+            "var": np.array(scaler.var_)}
+
+def load_pipeline():
+    """
+    Returns:
+    ========
+    pipeline: fitted feature pipeline from 'pipeline.pkl'
+    """
+    try:
+        PROJECT_ROOT_DIR = "."
+        return load_artifact(os.path.join(PROJECT_ROOT_DIR, "model", "pipeline.pkl"))
+    except OSError:
+        raise ValueError("There is no 'pipeline.pkl'. Please fit and save pipeline.")
+
+def load_model_state():
+    """
+    Returns:
+    ========
+    state: dict
+        version, alpha, statistics (Gram_functions.gram_statistics) and
+        scaler_moments {name: {n_samples_seen, mean, var}}
+    """
+    try:
+        PROJECT_ROOT_DIR = "."
+        return load_artifact(os.path.join(PROJECT_ROOT_DIR, "model", "model_state.pkl"))
+    except OSError:
+        raise ValueError("There is no 'model_state.pkl'. Please run init_model_state.")
+
+def _save_version(model, state):
+    """
+    Saves the versioned artifacts and points best_model.pkl to the new model
+    """
+    save_model(model, "best_model_v{}".format(state["version"]))
+    save_model(state, "model_state_v{}".format(state["version"]))
+    save_model(state, "model_state")
+    save_model(model, "best_model")
+
+def init_model_state(features, target, alpha = 0.0, chunksize = 100000, n_jobs = 1):
+    """
+    Fits the model from the saved pipeline on all labeled rows and stores
+    the statistics needed for incremental updates (version 1)
+
+    Parameters:
+    ===========
+    features: dataframe of raw features
+    target: series or 1-D array with target values
+    alpha: float Ridge penalty (0 gives LinearRegression)
+    chunksize: int number of rows per chunk
+    n_jobs: int number of workers
+
+    Returns:
+    ========
+    model: fitted model saved as best_model.pkl and best_model_v1.pkl
+    """
+    pipeline = load_pipeline()
+    model, statistics = gram_fit(pipeline, frame_chunks(features, target, chunksize),
+                                 alpha = alpha, n_jobs = n_jobs)
+
+    state = {"version": 1,
+             "alpha": alpha,
+             "statistics": statistics,
+             "scaler_moments": {name: _scaler_moments(StandardScaler().fit(features[columns])) 
+                                for name, _, columns in _scalers(pipeline)}}
+    _save_version(model, state)
+    return model
+
+def update_model(features, target, chunksize = 100000, n_jobs = 1):
+    """
+    Folds a new batch of labeled rows into the model state and saves a new
+    model version without revisiting old rows
+
+    Parameters:
+    ===========
+    features: dataframe of raw features of the new rows
+    target: series or 1-D array with target values of the new rows
+    chunksize: int number of rows per chunk
+    n_jobs: int number of workers
+
+    Returns:
+    ========
+    model: updated model saved as best_model.pkl and best_model_v{version}.pkl
+    """
+    pipeline = load_pipeline()
+    state = copy.deepcopy(load_model_state())
+
+    try:
+        model, statistics = gram_fit(pipeline, frame_chunks(features, target, chunksize),
+                                     alpha = state["alpha"], n_jobs = n_jobs,
+                                     statistics = state["statistics"])
+    except ValueError as error:
+        # Ex: a category that the pipeline has never seen
+        raise ValueError("Unable to update incrementally ({}). Please retrain the model.".format(error))
+
+    # running StandardScaler moments (partial_fit continues from the saved moments)
+    for name, scaler, columns in _scalers(pipeline):
+        moments = state["scaler_moments"][name]
+        running = StandardScaler()
+        running.n_samples_seen_ = moments["n_samples_seen"]
+        running.mean_ = moments["mean"]
+        running.var_ = moments["var"]
+        running.scale_ = np.sqrt(moments["var"])
+        running.feature_names_in_ = np.asarray(columns, dtype = object)
+        running.n_features_in_ = len(columns)
+        running.partial_fit(features[columns])
+        state["scaler_moments"][name] = _scaler_moments(running)
+
+    state["statistics"] = statistics
+    state["version"] = state["version"] + 1
+    _save_version(model, state)
+    return model
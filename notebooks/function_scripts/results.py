@@ -4,6 +4,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import json
 import joblib
 
 ### Functions
@@ -102,6 +103,44 @@ def plot_results(result_data, title):
     # save results
     save_figure(title)
         
+def plot_scaling(scaling_data, x, y, hue, title, logx = True, logy = True):
+    """
+    plots how a cost (Ex: fit time) grows with rows or cores for each model
+    
+    Parameters:
+    ==========
+    scaling_data: DataFrame
+        one row per benchmark run
+        
+    x: String
+        column on the x axis (Ex: "rows", "n_jobs")
+        
+    y: String
+        column on the y axis (Ex: "fit_time")
+        
+    hue: String
+        column with one line per value (Ex: "family")
+        
+    title: String
+        Title of the plot
+        
+    logx, logy: Boolean
+        log scale of the axes
+    """
+    
+    plt.figure(figsize = (8, 6))
+    sns.set(style = "darkgrid")
+    sns.lineplot(data = scaling_data, x = x, y = y, hue = hue, marker = "o")
+    plt.suptitle(title)
+    
+    if logx:
+        plt.xscale("log")
+    if logy:
+        plt.yscale("log")
+        
+    # save results
+    save_figure(title)
+        
 def display_search_results(grid_search):
     """
     Displays searched parameters and associated mse
@@ -117,8 +156,44 @@ def display_search_results(grid_search):
     """
     param_results = pd.DataFrame(grid_search.cv_results_["params"])
     param_results["mean_test_score"] = grid_search.cv_results_["mean_test_score"]
+    
+    # successive halving: scores of earlier rounds come from fewer rows
+    if "iter" in grid_search.cv_results_:
+        param_results["iter"] = grid_search.cv_results_["iter"]
+        param_results["n_resources"] = grid_search.cv_results_["n_resources"]
+        return param_results.sort_values(by = ["iter", "mean_test_score"])
     return param_results.sort_values(by = "mean_test_score")
 
+class search_results():
+    """
+    Container with the cv_results_ layout of GridSearchCV for searches that 
+    are run outside of sklearn (usable with display_search_results)
+    
+    Parameters
+    ==========
+    params: list of dicts of the evaluated parameters
+    fold_scores: array(n_candidates, n_folds) of test scores (neg MSE),
+        NaN for failed fits (ranked last)
+    extra: dict of additional cv_results_ columns
+    """
+    def __init__(self, params, fold_scores, extra = None):
+        fold_scores = np.asarray(fold_scores, dtype = np.float64)
+        mean_scores = fold_scores.mean(axis = 1)
+        
+        self.cv_results_ = {"params": list(params),
+                            "mean_test_score": mean_scores,
+                            "std_test_score": fold_scores.std(axis = 1),
+                            "rank_test_score": pd.Series(-mean_scores).rank(method = "min", na_option = "bottom").astype(int).to_numpy()}
+        for i in range(fold_scores.shape[1]):
+            self.cv_results_["split{}_test_score".format(i)] = fold_scores[:, i]
+        if extra is not None:
+            self.cv_results_.update(extra)
+            
+        best = int(np.argmax(np.nan_to_num(mean_scores, nan = -np.inf)))
+        self.best_index_ = best
+        self.best_params_ = self.cv_results_["params"][best]
+        self.best_score_ = mean_scores[best]
+
 def save_figure(fig_name, tight_layout=True, fig_extension="png"):
     """
     Saves image into the image folder
@@ -151,6 +226,90 @@ def save_figure(fig_name, tight_layout=True, fig_extension="png"):
         plt.tight_layout()
     plt.savefig(path, format=fig_extension)
     
+def figure_manifest():
+    """
+    Reads the manifest of saved figures (images/manifest.json)
+    
+    Returns:
+    ========
+    manifest: dict {figure name: key of the inputs the figure was drawn from}
+    """
+    PROJECT_ROOT_DIR = "."
+    path = os.path.join(PROJECT_ROOT_DIR, "images", "manifest.json")
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+    
+def show_saved_figure(fig_name, fig_extension="png"):
+    """
+    Displays a saved figure instead of drawing it again (inline in 
+    notebooks, a message otherwise)
+    
+    Parameters:
+    ===========
+    fig_name: String
+        filename for figure
+    """
+    PROJECT_ROOT_DIR = "."
+    path = os.path.join(PROJECT_ROOT_DIR, "images", fig_name + "." + fig_extension)
+    print("Reusing figure", fig_name)
+    
+    # IPython is only available in notebooks
+    try:
+        from IPython import get_ipython
+        from IPython.display import Image, display
+    except ImportError:
+        return
+    if get_ipython() is not None:
+        display(Image(filename = path))
+    
+def figure_is_current(fig_name, key, fig_extension="png"):
+    """
+    Checks if a saved figure was drawn from inputs with the same key
+    
+    Parameters:
+    ===========
+    fig_name: String
+        filename for figure
+        
+    key: String
+        hash of the inputs and parameters of the figure
+        
+    Returns:
+    ========
+    current: Boolean
+    """
+    PROJECT_ROOT_DIR = "."
+    path = os.path.join(PROJECT_ROOT_DIR, "images", fig_name + "." + fig_extension)
+    return figure_manifest().get(fig_name) == key and os.path.exists(path)
+    
+def record_figure(fig_name, key):
+    """
+    Stores the key of a saved figure in the manifest
+    
+    Parameters:
+    ===========
+    fig_name: String
+        filename for figure
+        
+    key: String
+        hash of the inputs and parameters of the figure
+    """
+    PROJECT_ROOT_DIR = "."
+    IMAGES_PATH = os.path.join(PROJECT_ROOT_DIR, "images")
+    os.makedirs(IMAGES_PATH, exist_ok=True)
+    
+    manifest = figure_manifest()
+    manifest[fig_name] = key
+    
+    # write then rename so a reader never sees a half written manifest
+    path = os.path.join(IMAGES_PATH, "manifest.json")
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent = 2, sort_keys = True)
+    os.replace(path + ".tmp", path)
+    
 def plot_feature_importance(importance, names):
     """
     Create arrays from feature importance and feature names